@@ -0,0 +1,396 @@
+import os
+import sys
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from collections import Counter
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+from google.cloud.bigquery import SchemaField
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.config.app_config_loader import AppConfigLoader
+from src.graph.runner import get_graph, run_chat_once
+from src.services import llm as llm_module
+from src.services.big_query_runner import BigQueryRunner
+from src.services.runner_pool import get_runner_pool
+from src.services.scheduler import (
+    configure_scheduler,
+    percentile,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BATCH,
+    PRIORITY_CLASSES,
+)
+
+INTERACTIVE_QUESTIONS = [
+    "What is the revenue by product category?",
+    "How many orders are in each status?",
+    "Which countries do our users come from?",
+]
+BATCH_QUESTION = "What is the monthly revenue trend?"
+
+
+def fake_backend(mean_seconds: float) -> None:
+    """
+    Simulate an LLM or BigQuery call with a latency around the mean.
+
+    Args:
+        mean_seconds (float): Mean latency.
+    """
+    time.sleep(random.uniform(0.5, 1.5) * mean_seconds)
+
+
+class FakeChatModel:
+    """
+    Stand-in for the Gemini chat models.
+
+    Each call sleeps like an LLM round trip. The model asks for one query per
+    call until a question has used `iterations - 1` queries, then answers.
+
+    Attributes:
+        latency_seconds (float): Mean latency of a call.
+        iterations (int): LLM calls per question.
+        dataset_id (str): Dataset the generated queries read from.
+    """
+
+    def __init__(self, latency_seconds: float, iterations: int, dataset_id: str) -> None:
+        """
+        Initialize the fake model.
+
+        Args:
+            latency_seconds (float): Mean latency of a call.
+            iterations (int): LLM calls per question.
+            dataset_id (str): Dataset the generated queries read from.
+        """
+        self.latency_seconds = latency_seconds
+        self.iterations = iterations
+        self.dataset_id = dataset_id
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> "FakeChatModel":
+        """
+        Accept tools like a chat model; the fake always knows how to call the query tool.
+
+        Returns:
+            FakeChatModel: The model itself.
+        """
+        return self
+
+    def invoke(self, messages: List[Any], *args: Any, **kwargs: Any) -> AIMessage:
+        """
+        Answer the latest question or ask for another query.
+
+        Args:
+            messages (List[Any]): The prompt messages.
+
+        Returns:
+            AIMessage: A query tool call, or the final answer.
+        """
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        calls = sum(1 for m in messages[last_human + 1:] if isinstance(m, AIMessage))
+        fake_backend(self.latency_seconds)
+        if calls < self.iterations - 1:
+            # A unique tag keeps queries of different turns from coalescing into one job.
+            sql = (
+                f"SELECT status, COUNT(*) AS orders, '{uuid.uuid4().hex}' AS tag "
+                f"FROM `{self.dataset_id}.orders` GROUP BY status LIMIT 10"
+            )
+            return AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": "query_bigquery_tool",
+                    "args": {"sql": sql, "top_n_rows": 10},
+                    "id": f"call_{uuid.uuid4().hex}",
+                }],
+            )
+        return AIMessage(content=f"Answer after {calls} queries.")
+
+
+class FakeBigQueryClient:
+    """
+    Stand-in for bigquery.Client serving queries, dry runs and table metadata with fake latencies.
+
+    Attributes:
+        query_seconds (float): Mean latency of a query job.
+        dry_run_seconds (float): Mean latency of a dry run or metadata call.
+    """
+
+    def __init__(self, query_seconds: float, dry_run_seconds: float) -> None:
+        """
+        Initialize the fake client.
+
+        Args:
+            query_seconds (float): Mean latency of a query job.
+            dry_run_seconds (float): Mean latency of a dry run or metadata call.
+        """
+        self.query_seconds = query_seconds
+        self.dry_run_seconds = dry_run_seconds
+
+    def query(self, sql: str, job_config: Optional[Any] = None, **kwargs: Any) -> SimpleNamespace:
+        """
+        Run a fake query job.
+
+        Args:
+            sql (str): The SQL query.
+            job_config (Optional[Any]): Job configuration; dry runs only report bytes.
+            **kwargs: Further client options such as timeout, ignored.
+
+        Returns:
+            SimpleNamespace: A job with total_bytes_processed and result().to_dataframe().
+        """
+        if job_config is not None and job_config.dry_run:
+            fake_backend(self.dry_run_seconds)
+            return SimpleNamespace(total_bytes_processed=10 * 1024 ** 2)
+        fake_backend(self.query_seconds)
+        frame = pd.DataFrame({"status": ["Complete", "Shipped", "Cancelled"], "orders": [120, 45, 7]})
+        return SimpleNamespace(result=lambda **kwargs: SimpleNamespace(to_dataframe=lambda: frame))
+
+    def get_table(self, table_ref: str) -> SimpleNamespace:
+        """
+        Fetch fake table metadata.
+
+        Args:
+            table_ref (str): Full table reference.
+
+        Returns:
+            SimpleNamespace: A table with a schema.
+        """
+        fake_backend(self.dry_run_seconds)
+        return SimpleNamespace(schema=[
+            SchemaField("id", "INTEGER"),
+            SchemaField("status", "STRING"),
+            SchemaField("created_at", "TIMESTAMP"),
+        ])
+
+
+def configure(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Adjust the app config for the load test and install the fake backends.
+
+    The rate limiters keep their configured settings, so the fake calls are paced
+    like real ones and interactive turns also queue behind batch calls on the
+    limiters. The nested config sections are shared with AppConfigLoader, so the
+    changes apply to every component created afterwards.
+
+    Args:
+        args (argparse.Namespace): Load test settings.
+
+    Returns:
+        Dict[str, Any]: The adjusted config.
+    """
+    config = AppConfigLoader().get_config()
+    config["scheduler"]["enabled"] = True
+    config["agent"].setdefault("prefetch", {})["max_wait_seconds"] = args.prefetch_max_wait
+
+    bq_config = config["bigquery"]
+    client = FakeBigQueryClient(args.bigquery_seconds, args.dry_run_seconds)
+    get_runner_pool().add(BigQueryRunner(bq_config["project_id"], bq_config["dataset_id"], client=client))
+    # The shared model getters hand these out instead of building Gemini clients.
+    model = FakeChatModel(args.llm_seconds, args.iterations, bq_config["dataset_id"])
+    llm_module._llm = llm_module._fallback_llm = llm_module._fast_llm = model
+    return config
+
+
+def token_interval(config: Dict[str, Any]) -> float:
+    """
+    Longest wait for the next token of a configured rate limiter.
+
+    Args:
+        config (Dict[str, Any]): The adjusted config.
+
+    Returns:
+        float: One over the lowest configured rate in seconds, 0.0 if no limiter paces calls.
+    """
+    rates = [float((settings or {}).get("requests_per_second", 0)) for settings in config.get("rate_limits", {}).values()]
+    return max((1.0 / rate for rate in rates if rate > 0), default=0.0)
+
+
+def run_scenario(
+    label: str,
+    prioritized: bool,
+    batch_workers: int,
+    args: argparse.Namespace,
+    config: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Run interactive sessions through the agent graph while batch workers saturate the scheduler.
+
+    Without prioritization batch and interactive turns share one class and one
+    session, i.e. a FIFO queue. Speculative prefetch keeps its own class in both.
+
+    Args:
+        label (str): Scenario label, keeps the conversation threads of scenarios apart.
+        prioritized (bool): Use priority classes and per-session fair queuing.
+        batch_workers (int): Threads running batch turns back to back.
+        args (argparse.Namespace): Load test settings.
+        config (Dict[str, Any]): The adjusted config.
+
+    Returns:
+        Dict[str, Any]: Interactive turn latencies, batch turns per session and scheduler metrics.
+    """
+    scheduler = configure_scheduler(args.slots)
+    agent_config, bq_config = config["agent"], config["bigquery"]
+    stop = threading.Event()
+    latencies: List[float] = []
+    batch_turns: Counter = Counter()
+    lock = threading.Lock()
+
+    def batch_worker(worker: int) -> None:
+        session_id = f"batch-{worker % args.batch_sessions}"
+        turn = 0
+        while not stop.is_set():
+            turn += 1
+            run_chat_once(
+                BATCH_QUESTION,
+                agent_config,
+                bq_config,
+                priority=PRIORITY_BATCH if prioritized else PRIORITY_INTERACTIVE,
+                session_id=session_id if prioritized else "shared",
+                thread_id=f"{label}-batch-{worker}-{turn}",
+            )
+            with lock:
+                batch_turns[session_id] += 1
+
+    def interactive_session(session: int) -> None:
+        session_id = f"chat-{session}"
+        for turn in range(args.turns):
+            time.sleep(random.uniform(0.5, 1.5) * args.think_seconds)
+            start = time.perf_counter()
+            run_chat_once(
+                INTERACTIVE_QUESTIONS[turn % len(INTERACTIVE_QUESTIONS)],
+                agent_config,
+                bq_config,
+                priority=PRIORITY_INTERACTIVE,
+                session_id=session_id if prioritized else "shared",
+                thread_id=f"{label}-{session_id}",
+            )
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    background = [threading.Thread(target=batch_worker, args=(i,), daemon=True) for i in range(batch_workers)]
+    for thread in background:
+        thread.start()
+    if background:
+        # Let the batch load build up a queue before interactive users arrive.
+        time.sleep(args.warmup_seconds)
+    users = [threading.Thread(target=interactive_session, args=(i,)) for i in range(args.interactive_sessions)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    stop.set()
+    for thread in background:
+        thread.join()
+
+    return {"latencies": latencies, "batch_turns": dict(batch_turns), "metrics": scheduler.metrics()}
+
+
+def format_report(name: str, result: Dict[str, Any]) -> str:
+    """
+    Format the results of one scenario.
+
+    Args:
+        name (str): Scenario name.
+        result (Dict[str, Any]): Result of run_scenario.
+
+    Returns:
+        str: The report text.
+    """
+    latencies = result["latencies"]
+    lines = [
+        f"--- {name} ---",
+        f"Interactive turns: {len(latencies)} | p50 {percentile(latencies, 0.5):.3f}s | "
+        f"p95 {percentile(latencies, 0.95):.3f}s | max {max(latencies, default=0.0):.3f}s",
+        f"Batch turns per session: {result['batch_turns']}",
+        "Queue wait per class:",
+    ]
+    for cls in PRIORITY_CLASSES:
+        m = result["metrics"][cls]
+        lines.append(
+            f"  {cls:12s} granted {m['granted']:6d} | timeouts {m['timeouts']:4d} | "
+            f"p50 {m['wait_p50_seconds']:.3f}s | p95 {m['wait_p95_seconds']:.3f}s | max {m['wait_max_seconds']:.3f}s"
+        )
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command line parser of the load test.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Load-test the priority scheduler through the agent graph with a fake LLM and a fake "
+            "BigQuery client: batch turns saturate the slots while interactive sessions ask questions, "
+            "once with a FIFO queue and once with priority classes."
+        )
+    )
+    parser.add_argument("--slots", type=int, default=4, help="Scheduler slots")
+    parser.add_argument("--batch-workers", type=int, default=16, help="Threads running batch turns back to back")
+    parser.add_argument("--batch-sessions", type=int, default=4, help="Batch sessions the workers are spread over")
+    parser.add_argument("--interactive-sessions", type=int, default=2, help="Concurrent interactive users")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per interactive user")
+    parser.add_argument("--iterations", type=int, default=3, help="LLM iterations per turn")
+    parser.add_argument("--llm-seconds", type=float, default=0.05, help="Mean fake LLM latency")
+    parser.add_argument("--bigquery-seconds", type=float, default=0.03, help="Mean fake BigQuery query latency")
+    parser.add_argument("--dry-run-seconds", type=float, default=0.005, help="Mean fake dry run and metadata latency")
+    parser.add_argument("--think-seconds", type=float, default=0.05, help="Mean pause between interactive turns")
+    parser.add_argument("--prefetch-max-wait", type=float, default=0.1, help="Prefetch slot wait before giving up")
+    parser.add_argument("--warmup-seconds", type=float, default=0.5, help="Batch-only load before users arrive")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    return parser
+
+
+def main() -> None:
+    """
+    Run the scenarios and check the prioritized interactive p95 against its bound.
+
+    Interactive turns are first run without batch load to measure their latency
+    including graph overhead and rate limiter pacing. With priorities, each
+    interactive step then waits at most for one running step to finish, which
+    may itself have waited for a limiter token, and for its own token, since the
+    limiters serve interactive calls before queued batch calls. The p95 under
+    saturation therefore stays below the idle p95 plus, per step, one slowest
+    possible step and two token intervals of the slowest limiter. Exits with 1
+    if it does not.
+    """
+    args = build_parser().parse_args()
+    random.seed(args.seed)
+    logging.basicConfig(level=logging.ERROR)
+    config = configure(args)
+    steps = 2 * args.iterations - 1
+    slowest_step = 1.5 * max(args.llm_seconds, args.dry_run_seconds + args.bigquery_seconds)
+    step_wait = slowest_step + 2 * token_interval(config)
+
+    # The agent prints every message of a turn; keep the report readable.
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        get_graph()
+        idle = run_scenario("idle", True, 0, args, config)
+        fifo = run_scenario("fifo", False, args.batch_workers, args, config)
+        prioritized = run_scenario("priority", True, args.batch_workers, args, config)
+    print(format_report("Idle (no batch load)", idle))
+    print(format_report("FIFO (no priorities)", fifo))
+    print(format_report("Priority classes + fair queuing", prioritized))
+
+    idle_p95 = percentile(idle["latencies"], 0.95)
+    bound = idle_p95 + steps * step_wait
+    p95 = percentile(prioritized["latencies"], 0.95)
+    print(
+        f"\nIdle interactive p95 {idle_p95:.3f}s over {steps} steps; p95 bound {bound:.3f}s; "
+        f"prioritized p95 {p95:.3f}s; FIFO p95 {percentile(fifo['latencies'], 0.95):.3f}s"
+    )
+    if p95 > bound:
+        print("FAIL: interactive p95 exceeds the bound.")
+        sys.exit(1)
+    print("OK: interactive p95 stays within the bound under saturation.")
+
+
+if __name__ == "__main__":
+    main()
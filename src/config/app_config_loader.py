@@ -89,6 +89,8 @@ class AppConfigLoader:
         agent_config = config.setdefault("agent", {})
         if getattr(args, "model", None) is not None:
             agent_config["llm_model"] = args.model
+        if getattr(args, "no_schema_digest", False):
+            agent_config.setdefault("schema_digest", {})["enabled"] = False
 
         log_config = config.setdefault("logging", {})
         if getattr(args, "verbose", False):
@@ -12,14 +12,20 @@ class EnvConfig:
         google_api_key (str): The Google API key loaded from the environment.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, require_google_api_key: bool = True) -> None:
         """
         Initialize the EnvConfig and load the Google API key.
 
+        Args:
+            require_google_api_key (bool): Exit if the key is missing. Disabled when replaying recorded LLM calls.
+
         Raises:
-            SystemExit: If the GOOGLE_API_KEY environment variable is not set.
+            SystemExit: If the GOOGLE_API_KEY environment variable is not set and is required.
         """
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
+        if not self.google_api_key and not require_google_api_key:
+            logger.warning("GOOGLE_API_KEY is not set; continuing without it.")
+            return
         if not self.google_api_key:
             logger.error("GOOGLE_API_KEY environment variable is not set.")
             sys.exit("ERROR: GOOGLE_API_KEY environment variable is required.")
@@ -0,0 +1,157 @@
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, ToolMessage, BaseMessage
+
+logger = logging.getLogger(__name__)
+
+STAGE_NORMAL = "normal"
+STAGE_DEGRADED = "degraded"
+STAGE_EXHAUSTED = "exhausted"
+
+# Bytes reserved by tool calls of the current step, per (budget id, iteration), with the question's deadline.
+_reservations: Dict[Tuple[str, int], Tuple[int, float]] = {}
+_reservations_lock = threading.Lock()
+
+
+def new_budget(agent_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create the per-question budget carried in AgentState.
+
+    Limits are read from the `agent.budget` config section; `max_iterations`
+    comes from the agent config itself.
+
+    Args:
+        agent_config (Dict[str, Any]): Agent configuration.
+
+    Returns:
+        Dict[str, Any]: Budget limits with zeroed usage counters.
+    """
+    budget_config = agent_config.get("budget", {}) or {}
+    return {
+        "id": uuid.uuid4().hex,
+        "deadline": time.time() + budget_config.get("deadline_seconds", 120),
+        "deadline_seconds": budget_config.get("deadline_seconds", 120),
+        "max_bytes_scanned": budget_config.get("max_bytes_scanned", 5 * 1024 ** 3),
+        "max_llm_tokens": budget_config.get("max_llm_tokens", 200_000),
+        "max_iterations": agent_config.get("max_iterations", 5),
+        "degrade_at": budget_config.get("degrade_at", 0.6),
+        "degraded_top_n_rows": budget_config.get("degraded_top_n_rows", 50),
+        "bytes_scanned": 0,
+        "llm_tokens": 0,
+        "iterations": 0,
+        "stage": STAGE_NORMAL,
+    }
+
+
+def consumed_fraction(budget: Dict[str, Any]) -> float:
+    """
+    Return the largest fraction consumed across time, bytes, tokens and iterations.
+
+    Args:
+        budget (Dict[str, Any]): The budget from state.
+
+    Returns:
+        float: Consumed fraction, 1.0 or more when any limit is reached.
+    """
+    elapsed = budget["deadline_seconds"] - (budget["deadline"] - time.time())
+    fractions = [
+        elapsed / budget["deadline_seconds"] if budget["deadline_seconds"] else 1.0,
+        budget["bytes_scanned"] / budget["max_bytes_scanned"] if budget["max_bytes_scanned"] else 1.0,
+        budget["llm_tokens"] / budget["max_llm_tokens"] if budget["max_llm_tokens"] else 1.0,
+        budget["iterations"] / budget["max_iterations"] if budget["max_iterations"] else 1.0,
+    ]
+    return max(fractions)
+
+
+def budget_stage(budget: Dict[str, Any]) -> str:
+    """
+    Classify how much of the budget is left.
+
+    The last allowed iteration is always "exhausted" so the agent answers
+    before the graph's recursion limit is hit.
+
+    Args:
+        budget (Dict[str, Any]): The budget from state.
+
+    Returns:
+        str: One of "normal", "degraded" or "exhausted".
+    """
+    if budget["iterations"] >= budget["max_iterations"]:
+        return STAGE_EXHAUSTED
+    fraction = consumed_fraction(budget)
+    if fraction >= 1.0:
+        return STAGE_EXHAUSTED
+    if fraction >= budget["degrade_at"]:
+        return STAGE_DEGRADED
+    return STAGE_NORMAL
+
+
+def bytes_scanned_since_last_ai(messages: List[BaseMessage]) -> int:
+    """
+    Sum bytes reported by tool results produced after the last AI message.
+
+    Args:
+        messages (List[BaseMessage]): The conversation messages from state.
+
+    Returns:
+        int: Bytes scanned by the latest batch of tool calls.
+    """
+    total = 0
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            break
+        if isinstance(message, ToolMessage) and isinstance(message.artifact, dict):
+            total += int(message.artifact.get("bytes_processed", 0) or 0)
+    return total
+
+
+def reserve_bytes(budget: Dict[str, Any], bytes_processed: int) -> bool:
+    """
+    Reserve the bytes of a query against the question's remaining bytes budget.
+
+    Bytes scanned by a step's tool calls only reach budget["bytes_scanned"] at
+    the next AnalyzeNode call, and the calls of one step run in parallel, so
+    each call reserves its dry-run bytes here before it runs. Reservations of
+    earlier steps and of questions past their deadline are dropped.
+
+    Args:
+        budget (Dict[str, Any]): The budget from state; an empty budget reserves nothing.
+        bytes_processed (int): Dry-run bytes of the query.
+
+    Returns:
+        bool: False if the query would exceed the remaining bytes budget.
+    """
+    if not budget or "id" not in budget:
+        return True
+    key = (budget["id"], budget["iterations"])
+    now = time.time()
+    with _reservations_lock:
+        for stale in [
+            k for k, (_, deadline) in _reservations.items()
+            if deadline < now or (k[0] == key[0] and k[1] != key[1])
+        ]:
+            del _reservations[stale]
+        reserved, _ = _reservations.get(key, (0, budget["deadline"]))
+        if budget["bytes_scanned"] + reserved + bytes_processed > budget["max_bytes_scanned"]:
+            return False
+        _reservations[key] = (reserved + bytes_processed, budget["deadline"])
+        return True
+
+
+def top_n_rows_cap(budget: Dict[str, Any]) -> Optional[int]:
+    """
+    Return the row cap tools should apply at the current budget stage.
+
+    Args:
+        budget (Dict[str, Any]): The budget from state.
+
+    Returns:
+        Optional[int]: Maximum rows to render, or None when not degraded.
+    """
+    if budget.get("stage", STAGE_NORMAL) == STAGE_NORMAL:
+        return None
+    return budget.get("degraded_top_n_rows")
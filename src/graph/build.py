@@ -1,12 +1,61 @@
 import logging
+from typing import Any, Callable
 
+from langchain_core.runnables import Runnable, RunnableConfig
 from langgraph.graph import StateGraph
 from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import ToolNode
 
 from src.graph.state import AgentState
 from src.graph.nodes.analyze import AnalyzeNode
-from src.graph.tools.bigquery import query_bigquery_tool, describe_bigquery_table_schema_tool
+from src.graph.nodes.route import route_after_analyze
+from src.graph.tools.bigquery import (
+    query_bigquery_tool,
+    describe_bigquery_table_schema_tool,
+    fetch_query_result_page_tool,
+    load_tool_result_tool,
+)
+from src.services.scheduler import get_scheduler, priority_scope, session_weight, PRIORITY_INTERACTIVE
+from src.services.deadline import deadline_scope, remaining_seconds
+
+
+def scheduled(node: Any) -> Callable[[AgentState, RunnableConfig], Any]:
+    """
+    Wrap a graph node so it runs inside a scheduler slot.
+
+    The slot is held for the node only, so between nodes a run yields to
+    higher-priority work. Priority, session and an optional session weight come
+    from the run config's `configurable` section, the weight otherwise from
+    `scheduler.weights`. The priority also orders the node's calls queued on
+    rate limiters. The node runs under the question's deadline; once it has
+    passed, the node stops waiting for a slot and runs without one so the
+    question can still be answered.
+
+    Args:
+        node (Any): A callable node or a Runnable such as ToolNode.
+
+    Returns:
+        Callable[[AgentState, RunnableConfig], Any]: The wrapped node.
+    """
+    def run(state: AgentState, config: RunnableConfig) -> Any:
+        invoke = (lambda: node.invoke(state, config)) if isinstance(node, Runnable) else (lambda: node(state))
+        configurable = config.get("configurable", {})
+        priority = configurable.get("priority", PRIORITY_INTERACTIVE)
+        with deadline_scope((state.get("budget") or {}).get("deadline")), priority_scope(priority):
+            scheduler = get_scheduler()
+            if scheduler is None:
+                return invoke()
+            session_id = configurable.get("session_id") or configurable.get("thread_id", "default")
+            weight = session_weight(session_id, configurable.get("weight"))
+            with scheduler.slot(priority, session_id, weight, timeout=remaining_seconds()) as acquired:
+                if not acquired:
+                    logging.getLogger(__name__).warning(
+                        "Question deadline reached while waiting for a scheduler slot; running the node without one."
+                    )
+                return invoke()
+
+    return run
+
 
 def build_graph() -> StateGraph:
     """
@@ -19,13 +68,18 @@ def build_graph() -> StateGraph:
 
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("analyze", AnalyzeNode())
-    tools = [query_bigquery_tool, describe_bigquery_table_schema_tool]
+    workflow.add_node("analyze", scheduled(AnalyzeNode()))
+    tools = [
+        query_bigquery_tool,
+        describe_bigquery_table_schema_tool,
+        fetch_query_result_page_tool,
+        load_tool_result_tool,
+    ]
     tool_node = ToolNode(tools=tools)
-    workflow.add_node("tools", tool_node)
+    workflow.add_node("tools", scheduled(tool_node))
 
     workflow.add_conditional_edges(
-        "analyze", tools_condition, {"tools": "tools", "__end__": "__end__"}
+        "analyze", route_after_analyze, {"tools": "tools", "__end__": "__end__"}
     )
 
     workflow.add_edge("tools", "analyze")
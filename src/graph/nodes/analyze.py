@@ -1,22 +1,51 @@
 import logging
-from typing import Any 
+from typing import Any, Dict, List, Tuple
 
+from src.config.app_config_loader import AppConfigLoader
 from src.graph.nodes.base_node import BaseNode
+from src.services.llm import get_fast_llm, get_fallback_llm
+from src.services.rate_limiter import get_rate_limiter
+from src.services.cassette import call_backend, describe_messages
+from src.services.schema_digest import get_schema_digest
+from src.services.blob_store import expand_references, inline_length
+from src.services.deadline import DeadlineExceeded, deadline_scope
 from src.graph.state import AgentState
+from src.graph.budget import (
+    STAGE_DEGRADED,
+    STAGE_EXHAUSTED,
+    budget_stage,
+    bytes_scanned_since_last_ai,
+)
 from src.graph.tools.bigquery import (
+    get_runner,
+    resolve_dataset,
     query_bigquery_tool,
     describe_bigquery_table_schema_tool,
+    fetch_query_result_page_tool,
+    load_tool_result_tool,
 )
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import SystemMessage, AIMessage, ToolMessage, BaseMessage
 
 logger = logging.getLogger(__name__)
 
+# Hand-written table lists, used when the schema digest is disabled or unavailable.
+STATIC_SCHEMAS = {
+    "bigquery-public-data.thelook_ecommerce": "thelook_ecommerce_schema.md",
+}
+
+
 class AnalyzeNode(BaseNode):
     """
     Node responsible for analyzing the agent's state and invoking tools.
 
     Attributes:
         llm_with_tools: The LLM instance bound with tools for execution.
+        fallback_llm_with_tools: The fallback LLM bound with tools, used when the primary model fails.
+        fast_llm_with_tools: The faster LLM bound with tools, used when the budget runs low.
+        answer_llm: The faster LLM with tool calling disabled, used to force a final answer.
+        model_name (str): Name of the primary model, used to pick its rate limiter.
+        fallback_model_name (str): Name of the fallback model.
+        fast_model_name (str): Name of the faster model.
     """
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
@@ -25,11 +54,208 @@ class AnalyzeNode(BaseNode):
         """
         super().__init__(*args, **kwargs)
         logger.info("Initializing AnalyzeNode with tools.")
-        self.llm_with_tools = self.llm.bind_tools([
+        tools = [
             query_bigquery_tool,
             describe_bigquery_table_schema_tool,
-        ])
+            fetch_query_result_page_tool,
+            load_tool_result_tool,
+        ]
+        fast_llm = get_fast_llm()
+        self.llm_with_tools = self.llm.bind_tools(tools)
+        self.fallback_llm_with_tools = get_fallback_llm().bind_tools(tools)
+        self.fast_llm_with_tools = fast_llm.bind_tools(tools)
+        self.answer_llm = fast_llm.bind_tools(tools, tool_choice="none")
+
+        agent_config = AppConfigLoader().get_config().get("agent", {})
+        self.model_name = agent_config.get("llm_model", "gemini-2.5-pro")
+        self.fallback_model_name = agent_config.get("fallback_llm_model", "gemini-2.0-flash")
+        self.fast_model_name = agent_config.get(
+            "fast_llm_model", agent_config.get("fallback_llm_model", "gemini-2.0-flash")
+        )
+        self.schema_digest_config = agent_config.get("schema_digest", {}) or {}
+
+    @staticmethod
+    def _rehydrate_latest_tool_results(messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Expand stored tool result references produced since the last AI message.
+
+        Older tool results stay as compact references with a preview, so only the
+        results the model has not reasoned about yet are sent in full.
+
+        Args:
+            messages (List[BaseMessage]): The conversation messages from state.
+
+        Returns:
+            List[BaseMessage]: Messages with the latest tool results rehydrated.
+        """
+        last_ai_index = max(
+            (i for i, message in enumerate(messages) if isinstance(message, AIMessage)),
+            default=-1,
+        )
+        rehydrated = list(messages)
+        for i in range(last_ai_index + 1, len(rehydrated)):
+            message = rehydrated[i]
+            if isinstance(message, ToolMessage) and isinstance(message.content, str):
+                expanded = expand_references(message.content)
+                if expanded is not message.content:
+                    rehydrated[i] = message.model_copy(update={"content": expanded})
+        return rehydrated
+
+    @staticmethod
+    def _budget_note(budget: Dict[str, Any]) -> str:
+        """
+        Build the system prompt addendum describing the remaining budget.
+
+        Args:
+            budget (Dict[str, Any]): The budget from state, with the current stage set.
+
+        Returns:
+            str: Text appended to the system prompt, empty in the normal stage.
+        """
+        if budget["stage"] == STAGE_EXHAUSTED:
+            return (
+                "\n\nBudget exhausted: do not call any more tools. "
+                "Answer the question now using the evidence gathered so far, and mention if it is incomplete."
+            )
+        if budget["stage"] == STAGE_DEGRADED:
+            return (
+                f"\n\nBudget running low: prefer a single, cheap, well-aggregated query, "
+                f"use top_n_rows of at most {budget['degraded_top_n_rows']}, and answer as soon as possible."
+            )
+        return ""
+
+    def _static_schema(self, state: AgentState) -> str:
+        """
+        Build the static schema section used without a schema digest.
+
+        The default thelook dataset keeps its hand-written table list, which is also
+        the baseline the digest is compared against. Other datasets have none.
+
+        Args:
+            state (AgentState): The current state of the agent.
+
+        Returns:
+            str: The static table list, or a note to describe tables for other datasets.
+        """
+        try:
+            _, dataset_id = resolve_dataset(state.get("project_id"), state.get("dataset_id"))
+        except ValueError:
+            dataset_id = None
+        template = STATIC_SCHEMAS.get(dataset_id)
+        if template is None:
+            return "No table list for this dataset; describe the tables you need with describe_bigquery_table_schema_tool."
+        return self._load_prompt(template).strip()
+
+    def _schema_section(self, state: AgentState) -> str:
+        """
+        Build the schema section of the system prompt from the session dataset's schema digest.
+
+        Args:
+            state (AgentState): The current state of the agent.
 
+        Returns:
+            str: The schema digest, or the static schema if the digest is disabled or unavailable.
+        """
+        if not self.schema_digest_config.get("enabled", False):
+            return self._static_schema(state)
+        try:
+            runner = get_runner(state.get("project_id"), state.get("dataset_id"))
+            digest = get_schema_digest(
+                runner,
+                self.schema_digest_config.get("tables", []),
+                self.schema_digest_config.get("max_tokens", 600),
+            )
+        except Exception as e:
+            logger.warning(f"Schema digest unavailable, using the static schema: {e}")
+            return self._static_schema(state)
+        return (
+            "Already loaded below; do not call describe_bigquery_table_schema_tool "
+            f"for these tables unless you need a column that is not listed.\n{digest}"
+        )
+
+    def _render_prompt(self, state: AgentState) -> str:
+        """
+        Load the system prompt and fill in the session's dataset and schema.
+
+        Args:
+            state (AgentState): The current state of the agent.
+
+        Returns:
+            str: The system prompt.
+        """
+        dataset_id = state.get("dataset_id") or AppConfigLoader().get_config().get("bigquery", {}).get("dataset_id", "")
+        prompt = self._load_prompt("analyze.md")
+        return prompt.replace("{dataset_id}", dataset_id).replace("{schema}", self._schema_section(state))
+
+    @staticmethod
+    def _invoke_llm(candidates: List[Tuple[Any, str]], messages: List[BaseMessage]) -> BaseMessage:
+        """
+        Invoke the first model that succeeds, each under its own rate limiter.
+
+        Quota errors are retried with backoff by the model's limiter before the
+        next model is tried, so the fallback does not absorb rate limiting.
+
+        Args:
+            candidates (List[Tuple[Any, str]]): Bound models with their names, in order of preference.
+            messages (List[BaseMessage]): The prompt messages.
+
+        Returns:
+            BaseMessage: The model's response.
+
+        Raises:
+            DeadlineExceeded: If the question's deadline passes while waiting for a model.
+            Exception: The error of the last model if all of them fail.
+        """
+        for i, (llm, model_name) in enumerate(candidates):
+            try:
+                return call_backend(
+                    "llm",
+                    {"model": model_name, "messages": describe_messages(messages)},
+                    lambda: llm.invoke(messages),
+                    limiter=get_rate_limiter("llm", model_name),
+                )
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded) or i == len(candidates) - 1:
+                    raise
+                logger.warning(f"Model {model_name} failed: {e}; falling back to {candidates[i + 1][1]}.")
+
+    @staticmethod
+    def _final_answer(response: BaseMessage) -> AIMessage:
+        """
+        Turn the response of the exhausted stage into a plain final answer.
+
+        Tool calls cannot run anymore, and a call left without a ToolMessage would
+        break the next turn of the thread, so they are dropped; an empty answer is
+        replaced by a short notice.
+
+        Args:
+            response (BaseMessage): The model's response.
+
+        Returns:
+            AIMessage: A message without tool calls and with non-empty text.
+        """
+        content = response.content
+        if isinstance(content, list):
+            content = "".join(
+                part if isinstance(part, str) else str(part.get("text", ""))
+                for part in content
+                if isinstance(part, (str, dict))
+            )
+        tool_calls = getattr(response, "tool_calls", None)
+        if isinstance(content, str) and content.strip() and not tool_calls:
+            return response
+        if tool_calls:
+            logger.warning(f"Dropping {len(tool_calls)} tool calls requested after the budget was exhausted.")
+        if not isinstance(content, str) or not content.strip():
+            content = (
+                "I ran out of budget for this question before I could finish the analysis, "
+                "so I cannot give a reliable answer. Please try a narrower question."
+            )
+        return AIMessage(
+            content=content,
+            id=response.id,
+            usage_metadata=getattr(response, "usage_metadata", None),
+        )
 
     def __call__(self, state: AgentState) -> AgentState:
         """
@@ -45,15 +271,60 @@ class AnalyzeNode(BaseNode):
 
         try:
             messages = state.get("messages", [])
-            system_prompt = self._load_prompt("analyze.md")
+            base_prompt = self._render_prompt(state)
+            system_prompt = base_prompt
+
+            budget = dict(state.get("budget") or {})
+            if budget:
+                budget["bytes_scanned"] += bytes_scanned_since_last_ai(messages)
+                budget["iterations"] += 1
+                budget["stage"] = budget_stage(budget)
+                system_prompt += self._budget_note(budget)
+            stage = budget.get("stage")
+
+            if stage == STAGE_DEGRADED:
+                candidates = [(self.fast_llm_with_tools, self.fast_model_name)]
+            else:
+                candidates = [
+                    (self.llm_with_tools, self.model_name),
+                    (self.fallback_llm_with_tools, self.fallback_model_name),
+                ]
+            model_name = self.fast_model_name if stage == STAGE_EXHAUSTED else candidates[0][1]
+            logger.info(f"Budget stage: {stage or 'unbounded'}; using model {model_name}.")
 
             logger.info("Loaded system prompt for AnalyzeNode.")
-            messages = [SystemMessage(content=system_prompt)] + list(messages)
+            inline_chars = len(system_prompt) + sum(inline_length(str(m.content)) for m in messages)
+            messages = [SystemMessage(content=system_prompt)] + self._rehydrate_latest_tool_results(list(messages))
+            prompt_chars = sum(len(str(m.content)) for m in messages)
 
             logger.debug(f"Messages before invoking LLM: {messages}")
-            response = self.llm_with_tools.invoke(messages)
+            if stage != STAGE_EXHAUSTED:
+                try:
+                    response = self._invoke_llm(candidates, messages)
+                except DeadlineExceeded as e:
+                    logger.warning(f"{e} Asking for a final answer instead.")
+                    stage = STAGE_EXHAUSTED
+                    if budget:
+                        budget["stage"] = stage
+                    messages[0] = SystemMessage(content=base_prompt + self._budget_note({"stage": stage}))
+            if stage == STAGE_EXHAUSTED:
+                # The final answer gets its call even when the deadline has passed.
+                with deadline_scope(None):
+                    response = self._invoke_llm([(self.answer_llm, self.fast_model_name)], messages)
+                response = self._final_answer(response)
+
+            usage = getattr(response, "usage_metadata", None) or {}
+            if budget:
+                budget["llm_tokens"] += usage.get("total_tokens", 0)
+            logger.info(
+                f"Prompt size: {prompt_chars} chars (~{prompt_chars // 4} tokens est., "
+                f"{usage.get('input_tokens', 'n/a')} input tokens reported); "
+                f"{inline_chars} chars (~{inline_chars // 4} tokens est.) with all tool results inline."
+            )
 
             logger.info("AnalyzeNode successfully processed the state.")
+            if budget:
+                return {"messages": [response], "budget": budget}
             return {"messages": [response]}
         except Exception as e:
             logger.error(f"Error in AnalyzeNode: {e}", exc_info=True)
@@ -0,0 +1,31 @@
+import logging
+
+from langchain_core.messages import AIMessage
+
+from src.graph.budget import STAGE_EXHAUSTED
+from src.graph.state import AgentState
+
+logger = logging.getLogger(__name__)
+
+
+def route_after_analyze(state: AgentState) -> str:
+    """
+    Decide whether to run the requested tools or finish, taking the budget into account.
+
+    Args:
+        state (AgentState): The current state of the agent.
+
+    Returns:
+        str: "tools" if the last AI message requested tools and budget remains, otherwise "__end__".
+    """
+    messages = state.get("messages", [])
+    last_message = messages[-1] if messages else None
+    if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
+        return "__end__"
+
+    stage = state.get("budget", {}).get("stage")
+    if stage == STAGE_EXHAUSTED:
+        # AnalyzeNode strips tool calls in this stage; this only guards against a message that slipped through.
+        logger.warning("Budget exhausted; ignoring tool calls and ending the turn.")
+        return "__end__"
+    return "tools"
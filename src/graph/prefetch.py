@@ -0,0 +1,374 @@
+import re
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Set, Callable
+
+from src.config.app_config_loader import AppConfigLoader
+from src.graph.tools.bigquery import get_runner, query_job_config, MAX_BYTES_SCANNED
+from src.services.big_query_runner import BigQueryRunner
+from src.services.cassette import get_cassette
+from src.services.runner_pool import get_runner_pool
+from src.services.scheduler import get_scheduler, priority_scope, session_weight, PRIORITY_PREFETCH
+
+logger = logging.getLogger(__name__)
+
+# Cheap aggregates the agent commonly writes first. A template is used when every
+# keyword group has a word in the question; `{dataset}` is the session dataset.
+QUERY_TEMPLATES: List[Dict[str, Any]] = [
+    {
+        "name": "revenue_by_category",
+        "keywords": [{"revenue", "sales"}, {"category", "categories"}],
+        "sql": (
+            "SELECT p.category, ROUND(SUM(oi.sale_price), 2) AS revenue "
+            "FROM `{dataset}.order_items` AS oi JOIN `{dataset}.products` AS p ON oi.product_id = p.id "
+            "WHERE oi.status NOT IN ('Cancelled', 'Returned') "
+            "GROUP BY p.category ORDER BY revenue DESC LIMIT 100"
+        ),
+    },
+    {
+        "name": "monthly_revenue",
+        "keywords": [{"revenue", "sales"}, {"month", "monthly", "trend"}],
+        "sql": (
+            "SELECT FORMAT_TIMESTAMP('%Y-%m', created_at) AS month, ROUND(SUM(sale_price), 2) AS revenue "
+            "FROM `{dataset}.order_items` WHERE status NOT IN ('Cancelled', 'Returned') "
+            "GROUP BY month ORDER BY month LIMIT 1000"
+        ),
+    },
+    {
+        "name": "orders_by_status",
+        "keywords": [{"orders"}, {"status", "cancelled", "returned", "shipped", "delivered"}],
+        "sql": (
+            "SELECT status, COUNT(*) AS orders FROM `{dataset}.orders` "
+            "GROUP BY status ORDER BY orders DESC LIMIT 100"
+        ),
+    },
+    {
+        "name": "users_by_country",
+        "keywords": [{"users", "customers"}, {"country", "countries"}],
+        "sql": (
+            "SELECT country, COUNT(*) AS users FROM `{dataset}.users` "
+            "GROUP BY country ORDER BY users DESC LIMIT 100"
+        ),
+    },
+    {
+        "name": "users_by_traffic_source",
+        "keywords": [{"users", "customers", "signups"}, {"traffic", "channel", "source", "acquisition"}],
+        "sql": (
+            "SELECT traffic_source, COUNT(*) AS users FROM `{dataset}.users` "
+            "GROUP BY traffic_source ORDER BY users DESC LIMIT 100"
+        ),
+    },
+]
+
+# Question words that refer to a table under another name.
+TABLE_SYNONYMS: Dict[str, str] = {
+    "customer": "users",
+    "buyer": "users",
+    "item": "order_items",
+    "brand": "products",
+    "product": "products",
+    "purchase": "orders",
+}
+
+_prefetcher: Optional["SpeculativePrefetcher"] = None
+_prefetcher_lock = threading.Lock()
+
+
+def _stem(word: str) -> str:
+    """
+    Reduce a word to a crude singular form so "orders" matches "order".
+
+    Args:
+        word (str): Lower-case word.
+
+    Returns:
+        str: The stem.
+    """
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def question_terms(question: str) -> Set[str]:
+    """
+    Split a question into stemmed lower-case words.
+
+    Args:
+        question (str): The user's question.
+
+    Returns:
+        Set[str]: The question terms.
+    """
+    return {_stem(word) for word in re.findall(r"[a-z0-9]+", question.lower())}
+
+
+def match_tables(terms: Set[str], tables: List[str], schemas: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    """
+    Find tables a question refers to by table name, synonym or column name.
+
+    A name matches when all of its underscore-separated parts are question terms.
+
+    Args:
+        terms (Set[str]): Question terms.
+        tables (List[str]): Candidate tables.
+        schemas (Dict[str, List[Dict[str, Any]]]): Cached schemas used for column matching.
+
+    Returns:
+        List[str]: Matched tables in candidate order.
+    """
+    def mentioned(name: str) -> bool:
+        return all(_stem(part) in terms for part in name.lower().split("_") if part)
+
+    synonyms = {TABLE_SYNONYMS[term] for term in terms if term in TABLE_SYNONYMS}
+    matched = []
+    for table in tables:
+        columns = [col["name"] for col in schemas.get(table, []) if col["name"] != "id"]
+        if table in synonyms or mentioned(table) or any(mentioned(column) for column in columns):
+            matched.append(table)
+    return matched
+
+
+def match_templates(terms: Set[str]) -> List[Dict[str, Any]]:
+    """
+    Find query templates whose keyword groups all occur in the question.
+
+    Args:
+        terms (Set[str]): Question terms.
+
+    Returns:
+        List[Dict[str, Any]]: Matched templates in definition order.
+    """
+    return [
+        template for template in QUERY_TEMPLATES
+        if all(terms & {_stem(word) for word in group} for group in template["keywords"])
+    ]
+
+
+class SpeculativePrefetcher:
+    """
+    Warm BigQuery caches for a question while the first LLM call is in flight.
+
+    Between the question and the agent's first tool call lies a full LLM round
+    trip. The prefetcher uses it to refresh the schemas of tables the question
+    mentions and to dry-run matched query templates, running those that scan at
+    most max_bytes_per_query. Results are parked in the runner as speculative
+    entries; hit rate and wasted bytes are reported by speculation_stats().
+    Each step takes a "prefetch" scheduler slot and the rest of the prefetch is
+    dropped when no slot frees up within max_wait_seconds or the question's turn
+    has ended. At most max_pending prefetches are queued or running; further
+    questions are not prefetched.
+
+    Attributes:
+        tables (List[str]): Candidate tables for schema matching.
+        max_templates (int): Maximum number of templates prefetched per question.
+        max_bytes_per_query (int): Largest dry-run estimate a template may scan to be run.
+        max_wait_seconds (float): Longest wait for a scheduler slot before the prefetch is dropped.
+        max_pending (int): Maximum number of prefetches queued or running at once.
+    """
+
+    def __init__(
+        self,
+        tables: List[str],
+        max_templates: int = 2,
+        max_bytes_per_query: int = 100 * 1024 ** 2,
+        workers: int = 2,
+        max_wait_seconds: float = 2.0,
+        max_pending: int = 4,
+    ) -> None:
+        """
+        Initialize the prefetcher.
+
+        Args:
+            tables (List[str]): Candidate tables for schema matching.
+            max_templates (int): Maximum number of templates prefetched per question.
+            max_bytes_per_query (int): Largest dry-run estimate a template may scan to be run.
+            workers (int): Number of background prefetch threads.
+            max_wait_seconds (float): Longest wait for a scheduler slot before the prefetch is dropped.
+            max_pending (int): Maximum number of prefetches queued or running at once.
+        """
+        self.tables = list(tables)
+        self.max_templates = int(max_templates)
+        self.max_bytes_per_query = min(int(max_bytes_per_query), MAX_BYTES_SCANNED)
+        self.max_wait_seconds = float(max_wait_seconds)
+        self.max_pending = max(1, int(max_pending))
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="prefetch")
+
+    def start(
+        self,
+        question: str,
+        project_id: Optional[str] = None,
+        dataset_id: Optional[str] = None,
+        session_id: str = "chat",
+        turn_done: Optional[threading.Event] = None,
+    ) -> Optional[Future]:
+        """
+        Start prefetching for a question in the background.
+
+        The caller cancels the returned task and sets turn_done when the turn ends,
+        so a queued prefetch never starts and a running one stops before its next step.
+
+        Args:
+            question (str): The user's question.
+            project_id (Optional[str]): Session project, None for the config default.
+            dataset_id (Optional[str]): Session dataset, None for the config default.
+            session_id (str): Session the prefetch is scheduled under.
+            turn_done (Optional[threading.Event]): Set when the question's turn has ended.
+
+        Returns:
+            Optional[Future]: The background task, resolving to the bytes scanned by its
+            speculative queries, or None when prefetching is skipped.
+        """
+        if get_cassette() is not None:
+            # Background calls would interleave with the agent's and make recordings nondeterministic.
+            logger.debug("Skipping speculative prefetch while a cassette is active.")
+            return None
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                logger.info(f"Skipping speculative prefetch: {self._pending} prefetches are already pending.")
+                return None
+            self._pending += 1
+        future = self._executor.submit(
+            self._prefetch, question, project_id, dataset_id, session_id, turn_done or threading.Event()
+        )
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future: Future) -> None:
+        """
+        Release the pending count of a finished or cancelled prefetch.
+
+        Args:
+            future (Future): The prefetch task.
+        """
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _step(self, session_id: str, func: Callable[[], Any]) -> bool:
+        """
+        Run one prefetch step in a "prefetch" scheduler slot.
+
+        Args:
+            session_id (str): Session the prefetch is scheduled under.
+            func (Callable[[], Any]): The step.
+
+        Returns:
+            bool: False if no slot was free in time and the step was skipped.
+        """
+        scheduler = get_scheduler()
+        with priority_scope(PRIORITY_PREFETCH):
+            if scheduler is None:
+                func()
+                return True
+            weight = session_weight(session_id)
+            with scheduler.slot(PRIORITY_PREFETCH, session_id, weight, timeout=self.max_wait_seconds) as acquired:
+                if acquired:
+                    func()
+                return acquired
+
+    def _prefetch(
+        self,
+        question: str,
+        project_id: Optional[str],
+        dataset_id: Optional[str],
+        session_id: str,
+        turn_done: threading.Event,
+    ) -> int:
+        """
+        Match the question and refresh schemas, warm dry runs and run cheap queries.
+
+        Args:
+            question (str): The user's question.
+            project_id (Optional[str]): Session project.
+            dataset_id (Optional[str]): Session dataset.
+            session_id (str): Session the prefetch is scheduled under.
+            turn_done (threading.Event): Set when the question's turn has ended.
+
+        Returns:
+            int: Bytes scanned by the speculative queries of this question.
+        """
+        scanned: List[int] = []
+        if turn_done.is_set():
+            return 0
+        try:
+            runner = get_runner(project_id, dataset_id)
+            terms = question_terms(question)
+            tables = match_tables(terms, self.tables, runner.cached_schemas())
+            templates = match_templates(terms)[: self.max_templates]
+            logger.info(
+                f"Speculative prefetch: tables {tables}, templates {[t['name'] for t in templates]}."
+            )
+            steps = [lambda table=table: runner.get_table_schema(table, refresh=True) for table in tables]
+            steps += [
+                lambda template=template: scanned.append(self._prefetch_template(runner, template))
+                for template in templates
+            ]
+            for step in steps:
+                if turn_done.is_set():
+                    logger.info("Dropping speculative prefetch: the turn has already ended.")
+                    break
+                if not self._step(session_id, step):
+                    logger.info("Dropping speculative prefetch: no scheduler slot became free in time.")
+                    break
+        except Exception as e:
+            logger.warning(f"Speculative prefetch failed: {e}")
+        return sum(scanned)
+
+    def _prefetch_template(self, runner: BigQueryRunner, template: Dict[str, Any]) -> int:
+        """
+        Dry-run a template and run it when it is cheap enough.
+
+        Args:
+            runner (BigQueryRunner): Runner of the session dataset.
+            template (Dict[str, Any]): The matched query template.
+
+        Returns:
+            int: Bytes scanned by the query, 0 if it was not run.
+        """
+        sql = template["sql"].format(dataset=runner.dataset_id)
+        try:
+            bytes_processed = runner.dry_run(sql, speculative=True)
+            if bytes_processed > self.max_bytes_per_query:
+                logger.info(f"Not prefetching template {template['name']}: would scan {bytes_processed} bytes.")
+                return 0
+            runner.execute_query(sql, query_job_config(), speculative=True, bytes_estimate=bytes_processed)
+            logger.info(f"Prefetched template {template['name']} ({bytes_processed} bytes).")
+            return bytes_processed
+        except Exception as e:
+            logger.warning(f"Failed to prefetch template {template['name']}: {e}")
+            return 0
+
+
+def get_prefetcher() -> Optional[SpeculativePrefetcher]:
+    """
+    Retrieve the shared prefetcher, creating it from the `agent.prefetch` config section.
+
+    Returns:
+        Optional[SpeculativePrefetcher]: The prefetcher, or None when prefetching is disabled.
+    """
+    global _prefetcher
+    settings = AppConfigLoader().get_config().get("agent", {}).get("prefetch", {}) or {}
+    if not settings.get("enabled", False):
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            logger.info("Initializing speculative prefetcher.")
+            _prefetcher = SpeculativePrefetcher(
+                tables=settings.get("tables", []),
+                max_templates=settings.get("max_templates", 2),
+                max_bytes_per_query=settings.get("max_bytes_per_query", 100 * 1024 ** 2),
+                workers=settings.get("workers", 2),
+                max_wait_seconds=settings.get("max_wait_seconds", 2.0),
+                max_pending=settings.get("max_pending", 4),
+            )
+        return _prefetcher
+
+
+def get_speculation_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return speculation hit and waste counters of all pooled runners.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Speculation stats per dataset.
+    """
+    return {runner.dataset_id: runner.speculation_stats() for runner in get_runner_pool().runners()}
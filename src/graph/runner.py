@@ -1,15 +1,28 @@
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
 from typing import Optional, Dict, Any
 
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.errors import GraphRecursionError
 
 from src.graph.build import build_graph
 from src.graph.state import AgentState
+from src.graph.budget import new_budget
+from src.graph.prefetch import get_prefetcher, get_speculation_stats
+from src.graph.tools.bigquery import get_coalescing_stats, get_runner
+from src.config.app_config_loader import AppConfigLoader
+from src.services.schema_digest import get_schema_digest
+from src.services.rate_limiter import get_rate_limiter_metrics
+from src.services.blob_store import expand_references
+from src.services.scheduler import get_scheduler, PRIORITY_INTERACTIVE
 
 logger = logging.getLogger(__name__)
 
 _graph: Optional[Any] = None
+_iteration_totals: Counter = Counter()
+_iteration_totals_lock = threading.Lock()
 
 
 def get_graph() -> Any:
@@ -26,14 +39,143 @@ def get_graph() -> Any:
     return _graph
 
 
-def run_chat_once(question: str, agent_config: Dict[str, Any]) -> str:
+def warm_schema_digest(bq_config: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Compute the schema digest at startup so the first question does not pay for it.
+
+    Args:
+        bq_config (Optional[Dict[str, Any]]): BigQuery configuration selecting the project and dataset.
+    """
+    digest_config = AppConfigLoader().get_config().get("agent", {}).get("schema_digest", {}) or {}
+    if not digest_config.get("enabled", False):
+        return
+    bq_config = bq_config or {}
+    try:
+        runner = get_runner(bq_config.get("project_id"), bq_config.get("dataset_id"))
+        get_schema_digest(runner, digest_config.get("tables", []), digest_config.get("max_tokens", 600))
+        logger.info("Schema digest warmed up.")
+    except Exception as e:
+        logger.warning(f"Failed to warm up schema digest: {e}")
+
+
+def log_turn_iterations(messages: list) -> Dict[str, int]:
+    """
+    Log LLM iterations, discovery iterations and schema lookups of the latest question,
+    and add them to the process totals.
+
+    A discovery iteration is an LLM iteration whose tool calls are all schema
+    lookups. Comparing the totals of a batch run with the schema digest enabled
+    and disabled (`--no-schema-digest`) measures the iterations the digest saves.
+
+    Args:
+        messages (list): The thread's messages after the turn.
+
+    Returns:
+        Dict[str, int]: Counts of the turn.
+    """
+    last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+    ai_messages = [m for m in messages[last_human + 1:] if isinstance(m, AIMessage)]
+    describe = "describe_bigquery_table_schema_tool"
+    stats = {
+        "questions": 1,
+        "iterations": len(ai_messages),
+        "discovery_iterations": sum(
+            1 for m in ai_messages if m.tool_calls and all(call["name"] == describe for call in m.tool_calls)
+        ),
+        "schema_lookups": sum(1 for m in ai_messages for call in m.tool_calls if call["name"] == describe),
+    }
+    with _iteration_totals_lock:
+        _iteration_totals.update(stats)
+    logger.info(
+        f"Turn used {stats['iterations']} LLM iterations, {stats['discovery_iterations']} of them "
+        f"schema discovery only, and {stats['schema_lookups']} schema lookups."
+    )
+    return stats
+
+
+def get_iteration_totals() -> Dict[str, int]:
+    """
+    Get LLM iteration counts summed over all turns of the process.
+
+    Returns:
+        Dict[str, int]: Questions, iterations, discovery iterations and schema lookups.
+    """
+    with _iteration_totals_lock:
+        return {key: _iteration_totals.get(key, 0) for key in ("questions", "iterations", "discovery_iterations", "schema_lookups")}
+
+
+def speculative_bytes_note(prefetch: Optional[Future]) -> str:
+    """
+    Describe the bytes scanned by the question's speculative prefetch.
+
+    Prefetched queries are billed whether or not the agent uses them, but only
+    the ones it uses show up in its tool results and so in the question budget.
+
+    Args:
+        prefetch (Optional[Future]): The question's prefetch task, None if none was started.
+
+    Returns:
+        str: Text to log next to the budget usage.
+    """
+    if prefetch is None:
+        return "no speculative prefetch"
+    if prefetch.cancelled():
+        return "speculative prefetch cancelled"
+    if not prefetch.done():
+        return "speculative prefetch still running"
+    return f"speculative prefetch scanned {prefetch.result()} bytes"
+
+
+def log_checkpoint_size(graph: Any, config: Dict[str, Any]) -> None:
+    """
+    Log the serialized size of the thread's messages as checkpointed, and as they
+    would be with all tool results inline.
+
+    Serializes the whole thread twice and reloads its spilled tool results, so it
+    is only called with debug logging enabled.
+
+    Args:
+        graph (Any): The compiled state graph.
+        config (Dict[str, Any]): The run config identifying the thread.
+    """
+    try:
+        messages = graph.get_state(config).values.get("messages", [])
+        serde = graph.checkpointer.serde
+        _, stored = serde.dumps_typed(messages)
+        inline = [
+            m.model_copy(update={"content": expand_references(m.content)}) if isinstance(m.content, str) else m
+            for m in messages
+        ]
+        _, inlined = serde.dumps_typed(inline)
+        logger.debug(
+            f"Checkpointed messages: {len(stored)} bytes ({len(inlined)} bytes with all tool results inline)."
+        )
+    except Exception as e:
+        logger.warning(f"Failed to measure checkpoint size: {e}")
+
+
+def run_chat_once(
+    question: str,
+    agent_config: Dict[str, Any],
+    bq_config: Optional[Dict[str, Any]] = None,
+    priority: str = PRIORITY_INTERACTIVE,
+    session_id: str = "chat",
+    thread_id: Optional[str] = None,
+    weight: Optional[float] = None,
+) -> str:
     """
     Run a single chat iteration with the agent.
 
     Args:
         question (str): The user's question.
-        bq_config (Dict[str, Any]): BigQuery configuration.
         agent_config (Dict[str, Any]): Agent configuration.
+        bq_config (Optional[Dict[str, Any]]): BigQuery configuration selecting the session's project and dataset.
+        priority (str): Scheduler priority class of the graph nodes, "interactive" or "batch".
+        session_id (str): Session sharing the scheduler fairly with other sessions of the same class.
+        thread_id (Optional[str]): Conversation thread; turns of the same thread see each other's
+            messages. None for the session's own thread.
+        weight (Optional[float]): Scheduler share of the session within its class, None for
+            the `scheduler.weights` entry of the session or 1.0.
 
     Returns:
         str: The agent's response or an error message.
@@ -44,20 +186,39 @@ def run_chat_once(question: str, agent_config: Dict[str, Any]) -> str:
     initial_state: AgentState = {
         "messages": [HumanMessage(content=question)],
         "question": question,
+        "budget": new_budget(agent_config),
     }
+    if bq_config:
+        initial_state["project_id"] = bq_config.get("project_id")
+        initial_state["dataset_id"] = bq_config.get("dataset_id")
+
+    prefetcher = get_prefetcher()
+    prefetch = None
+    turn_done = threading.Event()
+    if prefetcher is not None:
+        # Runs alongside the first LLM call, which is when BigQuery would otherwise sit idle.
+        prefetch = prefetcher.start(
+            question, initial_state.get("project_id"), initial_state.get("dataset_id"), session_id, turn_done
+        )
 
     max_iterations = agent_config.get("max_iterations", 5)
     recursion_limit = 2 * max_iterations + 1
 
+    run_config = {
+        "configurable": {
+            "thread_id": thread_id or session_id,
+            "priority": priority,
+            "session_id": session_id,
+        },
+        "recursion_limit": recursion_limit,
+    }
+    if weight is not None:
+        run_config["configurable"]["weight"] = weight
+
     try:
         events = graph.stream(
             initial_state,
-            config={
-                "configurable": {
-                    "thread_id": "1",
-                },
-                "recursion_limit": recursion_limit,
-            },
+            config=run_config,
             stream_mode="values",
         )
 
@@ -74,6 +235,24 @@ def run_chat_once(question: str, agent_config: Dict[str, Any]) -> str:
                 continue
 
         logger.info("Received final event from the graph.")
+        if logger.isEnabledFor(logging.DEBUG):
+            log_checkpoint_size(graph, run_config)
+        if event and event.get("messages"):
+            log_turn_iterations(event["messages"])
+        if event and event.get("budget"):
+            logger.info(
+                f"Budget usage for this question: {event['budget']}; {speculative_bytes_note(prefetch)}"
+            )
+        for name, metrics in get_rate_limiter_metrics().items():
+            logger.info(f"Rate limiter '{name}' metrics: {metrics}")
+        for name, stats in get_coalescing_stats().items():
+            logger.info(f"BigQuery {name} coalescing: {stats}")
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            logger.info(f"Scheduler queue wait metrics: {scheduler.metrics()}")
+        if prefetcher is not None:
+            for dataset, stats in get_speculation_stats().items():
+                logger.info(f"Speculative prefetch for {dataset}: {stats}")
 
         return (
             event["messages"][-1].content
@@ -87,5 +266,10 @@ def run_chat_once(question: str, agent_config: Dict[str, Any]) -> str:
     except Exception as e:
         logger.error(f"An error occurred during graph execution: {e}", exc_info=True)
         return f"Error: {e}"
+    finally:
+        # A prefetch that has not run by now can no longer help this question.
+        turn_done.set()
+        if prefetch is not None:
+            prefetch.cancel()
 
 
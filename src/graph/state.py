@@ -13,6 +13,7 @@ class AgentState(TypedDict, total=False):
         project_id (Optional[str]): The GCP project ID.
         model_name (str): The name of the model being used.
         summary (Optional[str]): A summary of the agent's response.
+        budget (Dict[str, Any]): Per-question limits (deadline, bytes scanned, LLM tokens, iterations) and usage.
     """
     messages: Annotated[List[Dict[str, Any]], add_messages]
     question: str
@@ -20,3 +21,4 @@ class AgentState(TypedDict, total=False):
     project_id: Optional[str]
     model_name: str
     summary: Optional[str]
+    budget: Dict[str, Any]
@@ -1,51 +1,100 @@
 import json
 import logging
 import re
-from typing import Optional
+from typing import Optional, List, Dict, Any, Tuple, Annotated
 
 from google.cloud import bigquery
 from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
 
 from src.config.app_config_loader import AppConfigLoader
-from src.services.big_query_runner import BigQueryRunner
+from src.graph.budget import top_n_rows_cap, reserve_bytes
+from src.services.big_query_runner import BigQueryRunner, normalize_sql
+from src.services.runner_pool import get_runner_pool
+from src.services.blob_store import get_blob_store, offload_text
+from src.services.result_store import get_result_store
+from src.services.deadline import remaining_seconds
 
 
-_RUNNER: Optional[BigQueryRunner] = None
 MAX_BYTES_SCANNED = 1024 * 1024 * 1024  # 1 GB
 MAX_LIMIT = 1000
+MAX_PAGE_ROWS = 500
 
 
-def get_runner() -> BigQueryRunner:
+def query_job_config() -> bigquery.QueryJobConfig:
     """
-    Return a shared BigQueryRunner instance.
-    Uses provided args or falls back to config. Initializes once only.
+    Return the job configuration used for agent queries.
+
+    Prefetched queries must use the same configuration to be served to the agent.
 
     Returns:
-        BigQueryRunner: The shared BigQueryRunner instance.
+        bigquery.QueryJobConfig: The query job configuration.
+    """
+    return bigquery.QueryJobConfig(dry_run=False, use_query_cache=True)
+
+
+def resolve_dataset(project_id: Optional[str] = None, dataset_id: Optional[str] = None) -> Tuple[str, str]:
     """
-    global _RUNNER
-    if _RUNNER is not None:
-        logging.info("Using existing BigQueryRunner instance.")
-        return _RUNNER
+    Resolve the project and dataset of a session, falling back to config.
+
+    Args:
+        project_id (Optional[str]): GCP project ID, e.g. from the session state.
+        dataset_id (Optional[str]): Dataset ID 'project.dataset', e.g. from the session state.
+
+    Returns:
+        Tuple[str, str]: The project ID and dataset ID.
 
-    logging.info("Initializing BigQueryRunner instance.")
-    config_loader = AppConfigLoader()
-    bigquery_config = config_loader.get_config().get("bigquery", {})
+    Raises:
+        ValueError: If neither the arguments nor the config provide them.
+    """
+    bigquery_config = AppConfigLoader().get_config().get("bigquery", {})
 
-    project_id = bigquery_config.get("project_id")
-    dataset_id = bigquery_config.get("dataset_id")
+    project_id = project_id or bigquery_config.get("project_id")
+    dataset_id = dataset_id or bigquery_config.get("dataset_id")
 
     if dataset_id is None or project_id is None:
         logging.error("Missing BigQuery configuration: project_id or dataset_id.")
         raise ValueError("dataset_id must be provided either as an argument or via config")
 
-    _RUNNER = BigQueryRunner(project_id=project_id, dataset_id=dataset_id)
-    logging.info("BigQueryRunner initialized successfully.")
-    return _RUNNER
+    return project_id, dataset_id
 
 
-@tool
-def query_bigquery_tool(*, sql: str, top_n_rows: Optional[int] = 500) -> str:
+def get_runner(project_id: Optional[str] = None, dataset_id: Optional[str] = None) -> BigQueryRunner:
+    """
+    Return the pooled BigQueryRunner for a project and dataset.
+    Uses provided args or falls back to config.
+
+    Args:
+        project_id (Optional[str]): GCP project ID, e.g. from the session state.
+        dataset_id (Optional[str]): Dataset ID 'project.dataset', e.g. from the session state.
+
+    Returns:
+        BigQueryRunner: The pooled BigQueryRunner instance.
+    """
+    return get_runner_pool().get(*resolve_dataset(project_id, dataset_id))
+
+
+def get_coalescing_stats() -> dict:
+    """
+    Return singleflight coalescing stats of all pooled runners.
+
+    Returns:
+        dict: Coalescing stats per runner and call type.
+    """
+    stats = {}
+    for runner in get_runner_pool().runners():
+        for name, flight_stats in runner.coalescing_stats().items():
+            stats[f"{runner.dataset_id} {name}"] = flight_stats
+    return stats
+
+
+@tool(response_format="content_and_artifact")
+def query_bigquery_tool(
+    *,
+    sql: str,
+    top_n_rows: Optional[int] = 500,
+    state: Annotated[Optional[dict], InjectedState] = None,
+) -> Tuple[str, Dict[str, Any]]:
     """
     Execute a BigQuery Standard SQL statement and return dataframe of top_n_rows (default to 500 rows).
 
@@ -53,6 +102,42 @@ def query_bigquery_tool(*, sql: str, top_n_rows: Optional[int] = 500) -> str:
         sql (str): The SQL query to execute.
         top_n_rows (Optional[int]): Number of rows to return. Defaults to 500.
 
+    Returns:
+        str: Query result as a string or error message.
+    """
+    state = state or {}
+    budget = state.get("budget") or {}
+    row_cap = top_n_rows_cap(budget)
+    if row_cap is not None and (top_n_rows is None or top_n_rows > row_cap):
+        logging.info(f"Budget running low; capping top_n_rows at {row_cap}.")
+        top_n_rows = row_cap
+
+    runner_args = (state.get("project_id"), state.get("dataset_id"))
+    usage: Dict[str, Any] = {"bytes_processed": 0}
+    return _execute_query(sql, top_n_rows, usage, runner_args, budget), usage
+
+
+def _execute_query(
+    sql: str,
+    top_n_rows: Optional[int],
+    usage: Dict[str, Any],
+    runner_args: Tuple[Optional[str], Optional[str]] = (None, None),
+    budget: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Validate, dry-run and execute a query for query_bigquery_tool.
+
+    Queries that would scan more than the question's remaining bytes budget are
+    rejected after the dry run, and BigQuery calls are bounded by the time left
+    until the question's deadline.
+
+    Args:
+        sql (str): The SQL query to execute.
+        top_n_rows (Optional[int]): Number of rows to return.
+        usage (Dict[str, Any]): Receives the bytes processed, reported to the budget as the tool artifact.
+        runner_args (Tuple[Optional[str], Optional[str]]): Session project and dataset, None for config defaults.
+        budget (Optional[Dict[str, Any]]): The question's budget from state, None for no budget.
+
     Returns:
         str: Query result as a string or error message.
     """
@@ -77,30 +162,51 @@ def query_bigquery_tool(*, sql: str, top_n_rows: Optional[int] = 500) -> str:
         logging.warning("Query rejected: Missing LIMIT clause.")
         return "ERROR: Your query must include a numeric LIMIT clause."
 
+    timeout = remaining_seconds()
+    if timeout is not None and timeout <= 0:
+        logging.warning("Query rejected: the question's deadline has passed.")
+        return "ERROR: The time budget of this question is used up. Answer with the evidence gathered so far."
+
     try:
-        runner = get_runner()
+        runner = get_runner(*runner_args)
 
         # --- Dry run ---
         try:
             logging.info("Performing dry run for query.")
-            job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
-            dry_run_job = runner.client.query(sql, job_config=job_config)
+            bytes_processed = runner.dry_run(sql, timeout=timeout)
 
-            if dry_run_job.total_bytes_processed > MAX_BYTES_SCANNED:
+            if bytes_processed > MAX_BYTES_SCANNED:
                 logging.warning("Query exceeds byte scan limit.")
-                return f"ERROR: Query would process {dry_run_job.total_bytes_processed} bytes, which exceeds the limit of {MAX_BYTES_SCANNED} bytes."
+                return f"ERROR: Query would process {bytes_processed} bytes, which exceeds the limit of {MAX_BYTES_SCANNED} bytes."
+
+            if not reserve_bytes(budget or {}, bytes_processed):
+                logging.warning("Query exceeds the remaining bytes budget of the question.")
+                left = max(0, budget["max_bytes_scanned"] - budget["bytes_scanned"])
+                return (
+                    f"ERROR: Query would process {bytes_processed} bytes, but only {left} bytes are left in this "
+                    "question's budget (less any queries already running). Use a narrower query or answer "
+                    "with the evidence gathered so far."
+                )
 
             logging.info("Dry run successful.")
+            usage["bytes_processed"] = bytes_processed
         except bigquery.GoogleCloudError as e:
             logging.error(f"Dry run failed: {e}")
             return f"Dry run failed: {e}"
 
         # --- Actual run ---
         logging.info("Executing query.")
-        job_config = bigquery.QueryJobConfig(dry_run=False, use_query_cache=True)
-        df = runner.execute_query(sql, job_config=job_config)
+        df = runner.execute_query(sql, job_config=query_job_config(), timeout=remaining_seconds())
         logging.info("Query executed successfully.")
-        return df.to_string() if top_n_rows is None else df.head(top_n_rows).to_string()
+        shown = df if top_n_rows is None else df.head(top_n_rows)
+        handle = get_result_store().put(normalize_sql(sql), df, (runner.project_id, runner.dataset_id))
+        if handle is None:
+            return offload_text(shown.to_string())
+        header = (
+            f"Result handle: {handle} ({len(df)} rows, {len(df.columns)} columns, showing {len(shown)}). "
+            "Use fetch_query_result_page_tool with this handle to page, project or sort without re-running."
+        )
+        return offload_text(f"{header}\n{shown.to_string()}")
 
     except Exception as e:
         logging.error(f"Query execution failed: {e}")
@@ -108,7 +214,65 @@ def query_bigquery_tool(*, sql: str, top_n_rows: Optional[int] = 500) -> str:
 
 
 @tool
-def describe_bigquery_table_schema_tool(*, table_name: str) -> str:
+def fetch_query_result_page_tool(
+    *,
+    handle: str,
+    offset: int = 0,
+    limit: int = 100,
+    columns: Optional[List[str]] = None,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+    state: Annotated[Optional[dict], InjectedState] = None,
+) -> str:
+    """
+    Return rows of an already executed query by its result handle, without re-running it.
+
+    Args:
+        handle (str): Result handle returned by query_bigquery_tool.
+        offset (int): Index of the first row to return. Defaults to 0.
+        limit (int): Number of rows to return (max 500). Defaults to 100.
+        columns (Optional[List[str]]): Columns to return. Defaults to all columns.
+        sort_by (Optional[str]): Column to sort by before slicing.
+        ascending (bool): Sort direction. Defaults to True.
+
+    Returns:
+        str: The requested rows as a string or error message.
+    """
+    logging.info(f"Fetching page from result handle: {handle}.")
+    try:
+        state = state or {}
+        df = get_result_store().get(handle, resolve_dataset(state.get("project_id"), state.get("dataset_id")))
+    except (KeyError, ValueError) as e:
+        logging.warning(f"Result handle lookup failed: {e}")
+        return f"ERROR: {e.args[0]}"
+
+    try:
+        if columns:
+            missing = [c for c in columns if c not in df.columns]
+            if missing:
+                return f"ERROR: Unknown columns {missing}. Available columns: {list(df.columns)}."
+            df = df[columns]
+        if sort_by is not None:
+            if sort_by not in df.columns:
+                return f"ERROR: Unknown sort column '{sort_by}'. Available columns: {list(df.columns)}."
+            df = df.sort_values(sort_by, ascending=ascending)
+
+        offset = max(0, offset)
+        limit = max(0, min(limit, MAX_PAGE_ROWS))
+        page = df.iloc[offset:offset + limit]
+        logging.info("Result page fetched successfully.")
+        return offload_text(f"Rows {offset}-{offset + len(page)} of {len(df)}:\n{page.to_string()}")
+    except Exception as e:
+        logging.error(f"Failed to fetch result page: {e}")
+        return f"ERROR: {e}"
+
+
+@tool
+def describe_bigquery_table_schema_tool(
+    *,
+    table_name: str,
+    state: Annotated[Optional[dict], InjectedState] = None,
+) -> str:
     """
     Return JSON schema for a table in the dataset (e.g., orders, users).
 
@@ -120,10 +284,31 @@ def describe_bigquery_table_schema_tool(*, table_name: str) -> str:
     """
     logging.info(f"Describing schema for table: {table_name}.")
     try:
-        runner = get_runner()
+        state = state or {}
+        runner = get_runner(state.get("project_id"), state.get("dataset_id"))
         schema = runner.get_table_schema(table_name)
         logging.info("Schema retrieved successfully.")
-        return json.dumps(schema)
+        return offload_text(json.dumps(schema))
     except Exception as e:
         logging.error(f"Failed to retrieve schema: {e}")
         return f"ERROR: {e}"
+
+
+@tool
+def load_tool_result_tool(*, ref: str) -> str:
+    """
+    Return the full content of an earlier tool result that was shortened to a reference.
+
+    Args:
+        ref (str): The reference key shown in the tool result, e.g. "sha256:...".
+
+    Returns:
+        str: The full tool result or error message.
+    """
+    logging.info(f"Loading tool result: {ref}.")
+    content = get_blob_store().get(ref.strip())
+    if content is None:
+        logging.warning("Tool result reference not found.")
+        return f"ERROR: Tool result '{ref}' was not found."
+    # Stored in state as a reference again; AnalyzeNode expands it for the next LLM call only.
+    return offload_text(content)
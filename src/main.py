@@ -1,12 +1,16 @@
 import sys
 import logging
 import argparse
+from contextlib import nullcontext
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
 
-from src.services.big_query_runner import BigQueryRunner
+from src.services.runner_pool import get_runner_pool
 from src.config.app_config_loader import AppConfigLoader
-from src.graph.runner import run_chat_once
+from src.graph.runner import run_chat_once, warm_schema_digest, get_iteration_totals
+from src.services.profiler import TurnProfiler
+from src.services.scheduler import PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from src.services.cassette import configure_cassette, MODE_RECORD, MODE_REPLAY, LATENCY_RECORDED, LATENCY_ZERO
 
 
 import logging
@@ -77,7 +81,7 @@ def cmd_check_bq(config: Dict[str, Any], tables_csv: Optional[str]) -> int:
     """
     bq_config = config.get("bigquery", {})
     try:
-        runner = BigQueryRunner(project_id=bq_config.get("project_id"), dataset_id=bq_config.get("dataset_id"))
+        runner = get_runner_pool().get(bq_config.get("project_id"), bq_config.get("dataset_id"))
         logging.info("BigQuery client initialized successfully.")
     except Exception as e:
         logging.error(f"Failed to initialize BigQuery client: {e}")
@@ -105,6 +109,118 @@ def cmd_check_bq(config: Dict[str, Any], tables_csv: Optional[str]) -> int:
 
     return 0
 
+def answer_question(
+    question: str,
+    agent_config: Dict[str, Any],
+    bq_config: Dict[str, Any],
+    profiler: Optional[TurnProfiler],
+    priority: str = PRIORITY_INTERACTIVE,
+    session_id: str = "chat",
+    thread_id: Optional[str] = None,
+) -> str:
+    """
+    Run one agent turn, profiling it if a profiler is given.
+
+    Args:
+        question (str): The user's question.
+        agent_config (Dict[str, Any]): Agent configuration.
+        bq_config (Dict[str, Any]): BigQuery configuration selecting the project and dataset.
+        profiler (Optional[TurnProfiler]): Profiler for the turn, or None.
+        priority (str): Scheduler priority class of the turn.
+        session_id (str): Scheduler session of the turn.
+        thread_id (Optional[str]): Conversation thread of the turn, None for the session's own thread.
+
+    Returns:
+        str: The agent's answer.
+    """
+    with profiler.profile_turn() if profiler else nullcontext():
+        return run_chat_once(
+            question=question,
+            agent_config=agent_config,
+            bq_config=bq_config,
+            priority=priority,
+            session_id=session_id,
+            thread_id=thread_id,
+        )
+
+
+def cmd_batch(config: Dict[str, Any], questions_path: str, profiler: Optional[TurnProfiler]) -> int:
+    """
+    Answer every question of a file, one question per line.
+
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+        questions_path (str): Path to the questions file.
+        profiler (Optional[TurnProfiler]): Profiler for each turn, or None.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure).
+    """
+    try:
+        with open(questions_path, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    except OSError as e:
+        logging.error(f"Failed to read questions file: {e}")
+        return 1
+
+    agent_config = config.get("agent", {})
+    bq_config = config.get("bigquery", {})
+    warm_schema_digest(bq_config)
+    logging.info(f"Running batch of {len(questions)} questions.")
+    schema = "digest" if (agent_config.get("schema_digest") or {}).get("enabled", False) else "static"
+    start_totals = get_iteration_totals()
+    per_question = []
+    for i, question in enumerate(questions, start=1):
+        print(f"================================ Question {i}/{len(questions)} ================================\n")
+        print(f"You: {question}\n")
+        before = get_iteration_totals()
+        try:
+            # Each question gets its own thread so earlier questions do not leak into its prompt.
+            answer = answer_question(
+                question, agent_config, bq_config, profiler, PRIORITY_BATCH, "batch", thread_id=f"batch-{i}"
+            )
+            print(f"Agent: {answer}\n")
+        except Exception as e:
+            logging.error(f"An error occurred while answering question {i}: {e}", exc_info=True)
+            print(f"Error: {e}\n")
+        after = get_iteration_totals()
+        counts = {key: after[key] - before[key] for key in ("iterations", "discovery_iterations", "schema_lookups")}
+        per_question.append(counts)
+
+    end_totals = get_iteration_totals()
+    totals = {key: end_totals[key] - start_totals[key] for key in end_totals}
+    answered = max(totals["questions"], 1)
+    print(f"Batch iterations per question (schema: {schema}):")
+    for i, counts in enumerate(per_question, start=1):
+        print(
+            f"  {i}: {counts['iterations']} iterations, {counts['discovery_iterations']} schema discovery only, "
+            f"{counts['schema_lookups']} schema lookups"
+        )
+    print(
+        f"Batch totals (schema: {schema}): {totals}; per question: "
+        f"{totals['iterations'] / answered:.2f} iterations, {totals['discovery_iterations'] / answered:.2f} discovery"
+    )
+    return 0
+
+
+def add_cassette_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add record/replay cassette options to a subcommand parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The subcommand parser.
+    """
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", default=None, metavar="DIR", help="Record LLM and BigQuery interactions to a cassette directory")
+    cassette.add_argument("--replay", default=None, metavar="DIR", help="Replay LLM and BigQuery interactions from a cassette directory")
+    parser.add_argument(
+        "--replay-latency",
+        choices=[LATENCY_RECORDED, LATENCY_ZERO],
+        default=LATENCY_ZERO,
+        help="Serve replayed interactions at their recorded latency or instantly",
+    )
+
+
 def build_parser() -> argparse.ArgumentParser:
     """
     Build the argument parser for the CLI.
@@ -128,6 +244,21 @@ def build_parser() -> argparse.ArgumentParser:
     chat.add_argument("--model", default=None, help="Gemini model name (overrides config.yaml)")
     chat.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging (overrides config.yaml)")
     chat.add_argument("--debug", action="store_true", help="Enable debug logging")
+    chat.add_argument("--profile", action="store_true", help="Profile each turn and write pstats/flamegraph artifacts")
+    chat.add_argument("--profile-dir", default="profiles", help="Directory for profile artifacts")
+    add_cassette_arguments(chat)
+
+    batch = subparsers.add_parser("batch", help="Answer questions from a file, one per line")
+    batch.add_argument("questions", help="Path to a text file with one question per line")
+    batch.add_argument("--project", default=None, help="GCP project id (overrides config.yaml)")
+    batch.add_argument("--dataset", default=None, help="Dataset id 'project.dataset' (overrides config.yaml)")
+    batch.add_argument("--model", default=None, help="Gemini model name (overrides config.yaml)")
+    batch.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging (overrides config.yaml)")
+    batch.add_argument("--debug", action="store_true", help="Enable debug logging")
+    batch.add_argument("--profile", action="store_true", help="Profile each turn and write pstats/flamegraph artifacts")
+    batch.add_argument("--profile-dir", default="profiles", help="Directory for profile artifacts")
+    batch.add_argument("--no-schema-digest", action="store_true", help="Use the static schema instead of the schema digest, e.g. to measure the iterations the digest saves")
+    add_cassette_arguments(batch)
 
     return parser
 
@@ -150,11 +281,27 @@ def main() -> None:
     except Exception as e:
         logging.warning(f"Failed to load environment variables: {e}")
 
+    profiler = TurnProfiler(output_dir=args.profile_dir) if getattr(args, "profile", False) else None
+
+    if getattr(args, "record", None):
+        configure_cassette(args.record, MODE_RECORD)
+    elif getattr(args, "replay", None):
+        try:
+            configure_cassette(args.replay, MODE_REPLAY, args.replay_latency)
+        except ValueError as e:
+            logging.error(f"Failed to set up cassette replay: {e}")
+            sys.exit(f"ERROR: {e}")
+
     if args.command == "check-bq":
         exit_code = cmd_check_bq(config, args.tables)
         sys.exit(exit_code)
+    elif args.command == "batch":
+        exit_code = cmd_batch(config, args.questions, profiler)
+        sys.exit(exit_code)
     elif args.command == "chat":
         agent_config = config.get("agent", {})
+        bq_config = config.get("bigquery", {})
+        warm_schema_digest(bq_config)
 
         print("EcomAgent ready. Type 'exit' to quit.\n")
         while True:
@@ -169,10 +316,7 @@ def main() -> None:
                 break
 
             try:
-                answer = run_chat_once(
-                    question=user_input,
-                    agent_config=agent_config,
-                )
+                answer = answer_question(user_input, agent_config, bq_config, profiler)
                 print("================================= Agent Answer =================================\n")
                 print(f"Agent: {answer}\n")
                 print("================================================================================\n")
@@ -1,5 +1,15 @@
 __all__ = [
     "big_query_runner",
+    "blob_store",
+    "cassette",
+    "deadline",
     "llm",
+    "profiler",
+    "rate_limiter",
+    "result_store",
+    "runner_pool",
+    "scheduler",
+    "schema_digest",
+    "singleflight",
 ]
 
@@ -1,35 +1,142 @@
+import re
+import json
+import time
 import logging
+import threading
 import pandas as pd
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 from google.cloud import bigquery
 
+from src.services.rate_limiter import get_rate_limiter
+from src.services.singleflight import SingleFlight
+from src.services.cassette import call_backend, get_cassette
+
 logger = logging.getLogger(__name__)
 
+# Comments, string literals (triple-quoted first) and quoted identifiers, whose text must be kept verbatim.
+_SQL_VERBATIM_PATTERN = re.compile(
+    r"(--[^\n]*|#[^\n]*|/\*.*?\*/"
+    r"|'''.*?'''|\"\"\".*?\"\"\""
+    r"|'(?:[^'\\\n]|\\.)*'|\"(?:[^\"\\\n]|\\.)*\"|`[^`]*`)",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Normalize SQL text so that formatting differences do not change its identity.
+    
+    Collapses whitespace between tokens and drops a trailing semicolon. Comments,
+    string literals and quoted identifiers are kept verbatim, and the line break
+    ending a `--`/`#` comment is kept, since it decides what the comment covers.
+    
+    Args:
+        sql_query: The SQL query text.
+        
+    Returns:
+        The normalized SQL text.
+    """
+    parts = _SQL_VERBATIM_PATTERN.split(sql_query.strip().rstrip(";").strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+            continue
+        ends_line_comment = i > 0 and parts[i - 1][:1] in ("-", "#") and "\n" in part
+        collapsed = re.sub(r"\s+", " ", part)
+        if ends_line_comment:
+            collapsed = "\n" + collapsed.lstrip()
+        normalized.append(collapsed)
+    return "".join(normalized).strip()
+
 class BigQueryRunner:
     """A lean BigQuery client for executing SQL queries and returning DataFrame results."""
     
-    def __init__(self, project_id: Optional[str] = None, dataset_id: Optional[str] = "bigquery-public-data.thelook_ecommerce") -> None:
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        dataset_id: Optional[str] = "bigquery-public-data.thelook_ecommerce",
+        client: Optional[bigquery.Client] = None,
+        schema_cache_ttl_seconds: float = 3600,
+        speculation_ttl_seconds: float = 300,
+    ) -> None:
         """Initialize BigQuery client.
         
         Args:
             project_id: Google Cloud project ID. If None, uses default credentials.
             dataset_id: BigQuery dataset ID. If None, uses default dataset.
+            client: Existing client to share, e.g. from the runner pool. If None, a new client is created.
+            schema_cache_ttl_seconds: How long a fetched table schema is reused before it is fetched again.
+            speculation_ttl_seconds: How long a speculatively prefetched result waits for a matching request.
         """
         logger.info("Initializing BigQuery client")
         try:
-            self.client = bigquery.Client(project=project_id)
+            cassette = get_cassette()
+            if client is not None:
+                self.client = client
+            elif cassette is not None and cassette.replaying:
+                # Replayed runs never reach BigQuery, so they need no credentials.
+                self.client = None
+            else:
+                self.client = bigquery.Client(project=project_id)
+            self.project_id = project_id
             self.dataset_id = dataset_id
+            self._query_flight = SingleFlight("bigquery_jobs")
+            self._dry_run_flight = SingleFlight("bigquery_dry_runs")
+            self.schema_cache_ttl_seconds = schema_cache_ttl_seconds
+            self.schema_version = 0
+            self._schema_cache: Dict[str, Tuple[List[Dict[str, Any]], float]] = {}
+            self._schema_lock = threading.Lock()
+            self.speculation_ttl_seconds = speculation_ttl_seconds
+            self._speculative: Dict[Tuple[str, Tuple[str, str]], Dict[str, Any]] = {}
+            self._speculation_lock = threading.Lock()
+            self._speculation_stats = {
+                "queries": 0,
+                "dry_runs": 0,
+                "query_hits": 0,
+                "dry_run_hits": 0,
+                "bytes_scanned": 0,
+                "wasted_bytes": 0,
+            }
             logger.info(f"BigQuery client initialized for dataset: {self.dataset_id}")
         except Exception as e:
             logger.error(f"Failed to initialize BigQuery client: {str(e)}")
             raise
     
-    def execute_query(self, sql_query: str, job_config: bigquery.QueryJobConfig) -> pd.DataFrame:
+    def _flight_key(self, sql_query: str, job_config: Optional[bigquery.QueryJobConfig]) -> Tuple[str, str]:
+        """Build the coalescing key for a query: normalized SQL plus job configuration.
+        
+        Args:
+            sql_query: The SQL query text.
+            job_config: Job configuration for the query.
+            
+        Returns:
+            Tuple of normalized SQL and serialized job configuration.
+        """
+        config_repr = json.dumps(job_config.to_api_repr(), sort_keys=True, default=str) if job_config else ""
+        return normalize_sql(sql_query), config_repr
+
+    def execute_query(
+        self,
+        sql_query: str,
+        job_config: bigquery.QueryJobConfig,
+        speculative: bool = False,
+        bytes_estimate: int = 0,
+        timeout: Optional[float] = None,
+    ) -> pd.DataFrame:
         """Execute a SQL query and return results as a DataFrame.
         
+        Identical queries issued concurrently share one job; the returned DataFrame
+        may be shared between callers and must be treated as read-only. Results of
+        speculative queries are kept for speculation_ttl_seconds and served to the
+        first matching regular request.
+        
         Args:
             sql_query: The SQL query to execute.
+            job_config: Job configuration for the query.
+            speculative: Whether the query is a prefetch nobody has asked for yet.
+            bytes_estimate: Dry-run bytes of a speculative query, counted as wasted if it is never used.
+            timeout: Seconds the job may run and its rows may take to arrive, None for no limit.
             
         Returns:
             DataFrame containing the query results.
@@ -38,39 +145,244 @@ class BigQueryRunner:
             Exception: If query execution fails.
         """
         try:
+            flight_key = self._flight_key(sql_query, job_config)
+            if not speculative:
+                cached = self._take_speculative("query", flight_key)
+                if cached is not None:
+                    logger.info(f"Query served from speculative prefetch, {len(cached)} rows")
+                    return cached
             logger.info(f"Executing BigQuery query")
-            query_job = self.client.query(sql_query, job_config=job_config)
-            df = query_job.result().to_dataframe()
+            df = self._query_flight.do(
+                flight_key,
+                lambda: call_backend(
+                    "bigquery_query",
+                    {"dataset": self.dataset_id, "sql": flight_key[0], "job_config": flight_key[1]},
+                    lambda: self._run_query(sql_query, job_config, timeout),
+                    limiter=get_rate_limiter("bigquery_jobs"),
+                ),
+            )
+            if speculative:
+                self._put_speculative("query", flight_key, df, bytes_estimate)
+            else:
+                # A regular request may have joined the speculative job in flight.
+                self._take_speculative("query", flight_key)
             logger.info(f"Query completed successfully, returned {len(df)} rows")
             return df
         except Exception as e:
             logger.error(f"BigQuery execution failed: {str(e)}")
             raise 
 
-    def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
+    def _run_query(
+        self,
+        sql_query: str,
+        job_config: bigquery.QueryJobConfig,
+        timeout: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """Submit a query job and wait for its rows. Called under the jobs rate limiter.
+        
+        With a timeout the job gets a matching job_timeout_ms, so BigQuery cancels
+        it instead of running on after the caller gave up.
+        
+        Args:
+            sql_query: The SQL query to execute.
+            job_config: Job configuration for the query.
+            timeout: Seconds the job may run, None for no limit.
+            
+        Returns:
+            DataFrame containing the query results.
+        """
+        if timeout is None:
+            query_job = self.client.query(sql_query, job_config=job_config)
+            return query_job.result().to_dataframe()
+        # Copied so the timeout does not change the coalescing key of the caller's config.
+        job_config = bigquery.QueryJobConfig.from_api_repr(job_config.to_api_repr())
+        job_config.job_timeout_ms = max(1, int(timeout * 1000))
+        query_job = self.client.query(sql_query, job_config=job_config, timeout=timeout)
+        return query_job.result(timeout=timeout).to_dataframe()
+
+    def dry_run(self, sql_query: str, speculative: bool = False, timeout: Optional[float] = None) -> int:
+        """Dry-run a SQL query to estimate the bytes it would scan.
+        
+        Args:
+            sql_query: The SQL query to validate.
+            speculative: Whether the dry run is a prefetch nobody has asked for yet.
+            timeout: Seconds to wait for the API, None for the client default.
+            
+        Returns:
+            Number of bytes the query would process.
+            
+        Raises:
+            Exception: If the dry run fails (e.g. invalid SQL).
+        """
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        flight_key = self._flight_key(sql_query, job_config)
+        if not speculative:
+            cached = self._take_speculative("dry_run", flight_key)
+            if cached is not None:
+                logger.info("Dry run served from speculative prefetch")
+                return cached
+        logger.info("Performing BigQuery dry run")
+        bytes_processed = self._dry_run_flight.do(
+            flight_key,
+            lambda: call_backend(
+                "bigquery_dry_run",
+                {"dataset": self.dataset_id, "sql": flight_key[0]},
+                lambda: self.client.query(
+                    sql_query, job_config=job_config, **({} if timeout is None else {"timeout": timeout})
+                ).total_bytes_processed,
+                limiter=get_rate_limiter("bigquery_dry_runs"),
+            ),
+        )
+        if speculative:
+            # Dry runs are not billed, so unused ones waste no bytes.
+            self._put_speculative("dry_run", flight_key, bytes_processed, 0)
+        else:
+            self._take_speculative("dry_run", flight_key)
+        return bytes_processed
+
+    def _expire_speculative(self, now: float) -> None:
+        """Drop speculative entries older than the TTL. Must hold the speculation lock.
+        
+        Args:
+            now: Current monotonic time.
+        """
+        for key in [k for k, e in self._speculative.items() if now - e["created"] > self.speculation_ttl_seconds]:
+            entry = self._speculative.pop(key)
+            if not entry["hit"]:
+                self._speculation_stats["wasted_bytes"] += entry["bytes"]
+
+    def _put_speculative(self, kind: str, flight_key: Tuple[str, str], value: Any, bytes_scanned: int) -> None:
+        """Keep the result of a speculative call for the first matching request.
+        
+        Args:
+            kind: "query" or "dry_run".
+            flight_key: Coalescing key of the call.
+            value: The result frame or byte estimate.
+            bytes_scanned: Bytes billed for producing the value.
+        """
+        with self._speculation_lock:
+            self._expire_speculative(time.monotonic())
+            previous = self._speculative.get((kind, flight_key))
+            if previous is not None and not previous["hit"]:
+                # Repeated prefetch of an unused value: the earlier scan was wasted.
+                self._speculation_stats["wasted_bytes"] += previous["bytes"]
+            self._speculative[(kind, flight_key)] = {
+                "value": value,
+                "bytes": bytes_scanned,
+                "created": time.monotonic(),
+                "hit": False,
+            }
+            self._speculation_stats["queries" if kind == "query" else "dry_runs"] += 1
+            self._speculation_stats["bytes_scanned"] += bytes_scanned
+
+    def _take_speculative(self, kind: str, flight_key: Tuple[str, str]) -> Any:
+        """Look up a speculative result for a regular request and count the hit.
+        
+        Args:
+            kind: "query" or "dry_run".
+            flight_key: Coalescing key of the request.
+            
+        Returns:
+            The prefetched value, or None if there is none.
+        """
+        with self._speculation_lock:
+            self._expire_speculative(time.monotonic())
+            entry = self._speculative.get((kind, flight_key))
+            if entry is None:
+                return None
+            if not entry["hit"]:
+                entry["hit"] = True
+                self._speculation_stats["query_hits" if kind == "query" else "dry_run_hits"] += 1
+            return entry["value"]
+
+    def speculation_stats(self) -> Dict[str, Any]:
+        """Get hit and waste counters of speculative queries and dry runs.
+        
+        Returns:
+            Dictionary with prefetch counts, hits, hit rate, billed bytes, wasted
+            bytes of expired unused results and bytes of unused results still pending.
+        """
+        with self._speculation_lock:
+            self._expire_speculative(time.monotonic())
+            stats = dict(self._speculation_stats)
+            stats["pending_bytes"] = sum(e["bytes"] for e in self._speculative.values() if not e["hit"])
+        prefetched = stats["queries"] + stats["dry_runs"]
+        stats["hit_rate"] = (stats["query_hits"] + stats["dry_run_hits"]) / prefetched if prefetched else 0.0
+        return stats
+
+    def coalescing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get singleflight coalescing stats for query jobs and dry runs.
+        
+        Returns:
+            Dictionary with request counts and coalescing ratios per call type.
+        """
+        return {
+            "jobs": self._query_flight.stats(),
+            "dry_runs": self._dry_run_flight.stats(),
+        }
+
+    def get_table_schema(self, table_name: str, refresh: bool = False) -> List[Dict[str, Any]]:
         """Get schema information for a specific table.
         
+        Schemas are cached for schema_cache_ttl_seconds. The schema_version counter
+        increases whenever a fetch adds a table or changes a cached schema.
+        
         Args:
             table_name: Name of the table (orders, order_items, products, users).
+            refresh: Fetch the schema even if a fresh cached copy exists.
             
         Returns:
             List of dictionaries containing column information.
         """
+        with self._schema_lock:
+            cached = self._schema_cache.get(table_name)
+        if cached is not None and not refresh and time.monotonic() - cached[1] < self.schema_cache_ttl_seconds:
+            return cached[0]
+
         try:
-            table_ref = f"{self.dataset_id}.{table_name}"
-            table = self.client.get_table(table_ref)
-            schema_info = []
-            for field in table.schema:
-                schema_info.append({
-                    "name": field.name,
-                    "type": field.field_type,
-                    "mode": field.mode,
-                    "description": field.description or ""
-                })
+            schema_info = call_backend(
+                "bigquery_schema",
+                {"dataset": self.dataset_id, "table": table_name},
+                lambda: self._fetch_table_schema(table_name),
+                limiter=get_rate_limiter("bigquery_metadata"),
+            )
+            with self._schema_lock:
+                previous = self._schema_cache.get(table_name)
+                if previous is None or previous[0] != schema_info:
+                    self.schema_version += 1
+                self._schema_cache[table_name] = (schema_info, time.monotonic())
             logger.info(f"Retrieved schema for table {table_name}")
             return schema_info
         except Exception as e:
             logger.error(f"Failed to get schema for table {table_name}: {str(e)}")
-            raise  
+            raise
 
+    def cached_schemas(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the schemas currently in the cache, fresh or not, without fetching.
+        
+        Returns:
+            Dictionary of table name to column information.
+        """
+        with self._schema_lock:
+            return {table: schema for table, (schema, _) in self._schema_cache.items()}
 
+    def _fetch_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
+        """Fetch table metadata from BigQuery and convert its schema to dictionaries.
+        
+        Args:
+            table_name: Name of the table.
+            
+        Returns:
+            List of dictionaries containing column information.
+        """
+        table_ref = f"{self.dataset_id}.{table_name}"
+        table = self.client.get_table(table_ref)
+        schema_info = []
+        for field in table.schema:
+            schema_info.append({
+                "name": field.name,
+                "type": field.field_type,
+                "mode": field.mode,
+                "description": field.description or ""
+            })
+        return schema_info
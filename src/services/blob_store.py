@@ -0,0 +1,268 @@
+import os
+import re
+import atexit
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from src.config.app_config_loader import AppConfigLoader
+
+logger = logging.getLogger(__name__)
+
+_store: Optional["BlobStore"] = None
+_store_lock = threading.Lock()
+
+_KEY_REGEX = r"sha256:[0-9a-f]{64}"
+KEY_PATTERN = re.compile(_KEY_REGEX)
+REFERENCE_PATTERN = re.compile(rf"\[tool-result-ref ({_KEY_REGEX}) \| (\d+) chars\]")
+
+
+class BlobStore:
+    """
+    Content-addressed store for bulky tool results, kept in memory and spilled to disk.
+
+    Blobs are keyed by the SHA-256 of their content, so storing the same result
+    twice is free and keys are stable across runs. Spilled blobs live in a
+    per-process directory that is removed at exit; beyond disk_max_bytes the
+    least recently spilled blobs are deleted.
+
+    Attributes:
+        memory_max_bytes (int): Memory budget before least recently used blobs spill to disk.
+        disk_max_bytes (int): Disk budget before least recently spilled blobs are deleted.
+        spill_dir (str): Per-process directory for spilled blobs.
+    """
+
+    def __init__(
+        self,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        disk_max_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        """
+        Initialize the blob store.
+
+        Args:
+            memory_max_bytes (int): Memory budget before blobs spill to disk.
+            spill_dir (Optional[str]): Parent directory for the spill directory. Defaults to the temp directory.
+            disk_max_bytes (int): Disk budget before spilled blobs are deleted.
+        """
+        self.memory_max_bytes = int(memory_max_bytes)
+        self.disk_max_bytes = int(disk_max_bytes)
+        self._spill_parent = spill_dir
+        self.spill_dir: Optional[str] = None
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+
+    def _spill_path(self, key: str) -> str:
+        """
+        Get the file path a blob spills to.
+
+        Args:
+            key (str): The blob key.
+
+        Returns:
+            str: Path of the spill file.
+
+        Raises:
+            ValueError: If the key is not a "sha256:<hex>" blob key.
+        """
+        if not KEY_PATTERN.fullmatch(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.spill_dir, key.split(":", 1)[1] + ".txt")
+
+    def _ensure_spill_dir(self) -> None:
+        """
+        Create the per-process spill directory on first use. Must hold the lock.
+        """
+        if self.spill_dir is None:
+            if self._spill_parent:
+                os.makedirs(self._spill_parent, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix="ecomagent-blobs-", dir=self._spill_parent)
+            atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+            logger.info(f"Spilling tool results to {self.spill_dir}.")
+
+    def _spill(self) -> None:
+        """
+        Move least recently used blobs to disk until memory is under budget, then
+        delete the oldest spilled blobs until disk is under budget. Must hold the lock.
+        """
+        while self._memory and self._memory_bytes > self.memory_max_bytes:
+            key, data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            if key in self._disk:
+                continue
+            self._ensure_spill_dir()
+            path = self._spill_path(key)
+            with open(path, "wb") as f:
+                f.write(data)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            logger.debug(f"Spilled blob {key} to {path}.")
+
+        while self._disk and self._disk_bytes > self.disk_max_bytes:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._spill_path(key))
+            except OSError as e:
+                logger.warning(f"Failed to delete spilled blob {key}: {e}")
+            logger.debug(f"Deleted spilled blob {key} (disk budget).")
+
+    def put(self, text: str) -> str:
+        """
+        Store text and return its content-addressed key.
+
+        Args:
+            text (str): The content to store.
+
+        Returns:
+            str: The blob key, e.g. "sha256:<hex>".
+        """
+        data = text.encode("utf-8")
+        key = "sha256:" + hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return key
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            self._spill()
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Load a blob from memory or disk.
+
+        Args:
+            key (str): The blob key.
+
+        Returns:
+            Optional[str]: The content, or None if the blob is unknown or the key is malformed.
+        """
+        if not KEY_PATTERN.fullmatch(key):
+            logger.warning(f"Rejected malformed blob key: {key!r}")
+            return None
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data.decode("utf-8")
+            if key not in self._disk:
+                logger.warning(f"Blob {key} not found.")
+                return None
+            path = self._spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            logger.warning(f"Blob {key} not found.")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get memory usage of the store.
+
+        Returns:
+            Dict[str, Any]: Number and size of in-memory and spilled blobs.
+        """
+        with self._lock:
+            return {
+                "memory_blobs": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_blobs": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+def get_blob_store() -> BlobStore:
+    """
+    Retrieve the shared blob store, creating it from the `tool_results` config section.
+
+    Returns:
+        BlobStore: The shared blob store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            settings = AppConfigLoader().get_config().get("tool_results", {}) or {}
+            logger.info("Initializing shared blob store.")
+            _store = BlobStore(
+                memory_max_bytes=settings.get("memory_max_bytes", 64 * 1024 * 1024),
+                spill_dir=settings.get("spill_dir"),
+                disk_max_bytes=settings.get("disk_max_bytes", 1024 * 1024 * 1024),
+            )
+        return _store
+
+
+def offload_text(text: str, inline_max_chars: Optional[int] = None, summary_lines: Optional[int] = None) -> str:
+    """
+    Replace bulky text with a compact reference plus a short preview.
+
+    Text under the inline limit is returned unchanged. The preview keeps at most
+    summary_lines lines and a quarter of the inline limit in characters, so a
+    single long line (e.g. a JSON schema) is shortened as well.
+
+    Args:
+        text (str): The full tool result.
+        inline_max_chars (Optional[int]): Results up to this size stay inline. Defaults to config.
+        summary_lines (Optional[int]): Number of leading lines kept as a preview. Defaults to config.
+
+    Returns:
+        str: The original text or its reference with preview.
+    """
+    settings = AppConfigLoader().get_config().get("tool_results", {}) or {}
+    if inline_max_chars is None:
+        inline_max_chars = settings.get("inline_max_chars", 2000)
+    if summary_lines is None:
+        summary_lines = settings.get("summary_lines", 8)
+    if len(text) <= inline_max_chars:
+        return text
+
+    key = get_blob_store().put(text)
+    lines = text.splitlines()
+    preview = "\n".join(lines[:summary_lines])
+    remaining = len(lines) - summary_lines
+    tail = f"\n... ({remaining} more lines)" if remaining > 0 else ""
+    max_preview_chars = inline_max_chars // 4
+    if len(preview) > max_preview_chars:
+        preview = preview[:max_preview_chars]
+        tail = f" ... ({len(text) - max_preview_chars} more chars)"
+    return f"[tool-result-ref {key} | {len(text)} chars]\n{preview}{tail}"
+
+
+def inline_length(text: str) -> int:
+    """
+    Get the length a text would have with its tool result reference expanded, without loading the blob.
+
+    Args:
+        text (str): Text that may start with a tool result reference.
+
+    Returns:
+        int: The size recorded in the reference, or the length of the text itself.
+    """
+    match = REFERENCE_PATTERN.match(text)
+    return int(match.group(2)) if match else len(text)
+
+
+def expand_references(text: str) -> str:
+    """
+    Rehydrate a text produced by offload_text back into the full content.
+
+    Args:
+        text (str): Text that may start with a tool result reference.
+
+    Returns:
+        str: The full content, or the text unchanged if it holds no resolvable reference.
+    """
+    match = REFERENCE_PATTERN.match(text)
+    if not match:
+        return text
+    full = get_blob_store().get(match.group(1))
+    return full if full is not None else text
@@ -0,0 +1,334 @@
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+import warnings
+import threading
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+LATENCY_RECORDED = "recorded"
+LATENCY_ZERO = "zero"
+
+_cassette: Optional["Cassette"] = None
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no recorded interaction is left for a request."""
+
+
+def _encode_llm(response: Any) -> Tuple[Any, Optional[bytes]]:
+    """Serialize a chat model response."""
+    from langchain_core.load import dumpd
+
+    return dumpd(response), None
+
+
+def _decode_llm(data: Any, payload: Optional[bytes]) -> Any:
+    """Rebuild a chat model response."""
+    from langchain_core.load import load
+
+    # load() is marked beta; replay only uses it to rebuild chat messages.
+    warnings.filterwarnings("ignore", message="The function `load` is in beta")
+    return load(data, allowed_objects="messages")
+
+
+def _encode_frame(df: pd.DataFrame) -> Tuple[Any, Optional[bytes]]:
+    """Serialize a result frame as Parquet."""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer)
+    return None, buffer.getvalue()
+
+
+def _decode_frame(data: Any, payload: Optional[bytes]) -> pd.DataFrame:
+    """Read a result frame from Parquet."""
+    return pd.read_parquet(io.BytesIO(payload))
+
+
+def _encode_json(value: Any) -> Tuple[Any, Optional[bytes]]:
+    """Store a JSON-serializable value as is."""
+    return value, None
+
+
+def _decode_json(data: Any, payload: Optional[bytes]) -> Any:
+    """Return a stored JSON value."""
+    return data
+
+
+# Interaction kinds that may be replayed in recording order when the request hash misses.
+_SEQUENTIAL_FALLBACK_KINDS = {"llm"}
+
+_CODECS: Dict[str, Tuple[Callable, Callable]] = {
+    "llm": (_encode_llm, _decode_llm),
+    "bigquery_query": (_encode_frame, _decode_frame),
+}
+
+
+class Cassette:
+    """
+    Records LLM and BigQuery interactions to a directory and serves them back.
+
+    Each interaction is stored under `<directory>/<kind>/` as a JSON file keyed by a
+    hash of its canonical request, with result frames in a Parquet sidecar. Replay
+    looks interactions up by request hash. When an LLM request differs from the
+    recording (e.g. a timestamp-dependent prompt), it falls back to the next
+    unused LLM interaction in recording order; BigQuery requests must match
+    exactly, so a changed query or table never receives another one's result.
+
+    Attributes:
+        directory (str): Cassette directory.
+        mode (str): "record" or "replay".
+        latency (str): In replay mode, "recorded" to sleep for the original latency or "zero".
+    """
+
+    def __init__(self, directory: str, mode: str, latency: str = LATENCY_ZERO) -> None:
+        """
+        Initialize the cassette.
+
+        Args:
+            directory (str): Cassette directory.
+            mode (str): "record" or "replay".
+            latency (str): Replay latency, "recorded" or "zero".
+
+        Raises:
+            ValueError: If mode or latency is unknown, or the replay directory does not exist.
+        """
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in (LATENCY_RECORDED, LATENCY_ZERO):
+            raise ValueError(f"Unknown replay latency: {latency}")
+        if mode == MODE_REPLAY and not os.path.isdir(directory):
+            raise ValueError(f"Cassette directory not found: {directory}")
+
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._used: set = set()
+        self._sequence: Dict[str, List[str]] = {}
+
+    @property
+    def replaying(self) -> bool:
+        """
+        Whether the cassette serves recorded interactions instead of live calls.
+        """
+        return self.mode == MODE_REPLAY
+
+    @staticmethod
+    def request_key(kind: str, request: Any) -> str:
+        """
+        Hash a canonical request.
+
+        Args:
+            kind (str): Interaction kind, e.g. "llm" or "bigquery_query".
+            request (Any): JSON-serializable request description.
+
+        Returns:
+            str: The request key.
+        """
+        canonical = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()[:20]
+
+    def _path(self, kind: str, name: str) -> str:
+        """Path of a file in the directory of an interaction kind."""
+        return os.path.join(self.directory, kind, name)
+
+    def _load_sequence(self, kind: str) -> List[str]:
+        """
+        Load the recording order of a kind. Must hold the lock.
+
+        Args:
+            kind (str): Interaction kind.
+
+        Returns:
+            List[str]: Interaction names in recording order.
+        """
+        if kind not in self._sequence:
+            try:
+                with open(self._path(kind, "index.jsonl"), "r", encoding="utf-8") as f:
+                    self._sequence[kind] = [json.loads(line)["name"] for line in f if line.strip()]
+            except FileNotFoundError:
+                self._sequence[kind] = []
+        return self._sequence[kind]
+
+    def record(self, kind: str, request: Any, live: Callable[[], Any]) -> Any:
+        """
+        Call the live backend and store the interaction.
+
+        Args:
+            kind (str): Interaction kind.
+            request (Any): JSON-serializable request description.
+            live (Callable[[], Any]): The live call.
+
+        Returns:
+            Any: The live result.
+        """
+        start = time.perf_counter()
+        result = live()
+        elapsed = time.perf_counter() - start
+
+        try:
+            self._store(kind, request, result, elapsed)
+        except Exception as e:
+            logger.error(f"Failed to record {kind} interaction: {e}", exc_info=True)
+        return result
+
+    def _store(self, kind: str, request: Any, result: Any, elapsed: float) -> None:
+        """
+        Write one interaction to the cassette directory.
+
+        Args:
+            kind (str): Interaction kind.
+            request (Any): JSON-serializable request description.
+            result (Any): The live result.
+            elapsed (float): Latency of the live call in seconds.
+        """
+        encode, _ = _CODECS.get(kind, (_encode_json, _decode_json))
+        data, payload = encode(result)
+        key = self.request_key(kind, request)
+        with self._lock:
+            n = self._counts.get(key, 0)
+            self._counts[key] = n + 1
+            name = f"{key}-{n}"
+            os.makedirs(self._path(kind, ""), exist_ok=True)
+            record = {"request": request, "elapsed": elapsed, "response": data, "payload": None}
+            if payload is not None:
+                record["payload"] = f"{name}.parquet"
+                with open(self._path(kind, record["payload"]), "wb") as f:
+                    f.write(payload)
+            with open(self._path(kind, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(record, f, default=str)
+            with open(self._path(kind, "index.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"name": name, "elapsed": elapsed}) + "\n")
+        logger.debug(f"Recorded {kind} interaction {name} ({elapsed:.3f}s).")
+
+    def replay(self, kind: str, request: Any) -> Any:
+        """
+        Serve a recorded interaction.
+
+        Args:
+            kind (str): Interaction kind.
+            request (Any): JSON-serializable request description.
+
+        Returns:
+            Any: The recorded result.
+
+        Raises:
+            CassetteMissError: If no recorded interaction is left for the request.
+        """
+        key = self.request_key(kind, request)
+        with self._lock:
+            n = self._counts.get(key, 0)
+            # Skip recordings already served through the recording-order fallback.
+            while f"{key}-{n}" in self._used:
+                n += 1
+            name = f"{key}-{n}"
+            if os.path.exists(self._path(kind, f"{name}.json")):
+                self._counts[key] = n + 1
+            elif kind not in _SEQUENTIAL_FALLBACK_KINDS:
+                raise CassetteMissError(f"No recorded {kind} interaction for request {key}.")
+            else:
+                name = next((s for s in self._load_sequence(kind) if s not in self._used), None)
+                if name is None:
+                    raise CassetteMissError(f"No recorded {kind} interaction left for request {key}.")
+                logger.warning(f"Cassette miss for {kind} request {key}; replaying {name} in recording order.")
+            self._used.add(name)
+
+        with open(self._path(kind, f"{name}.json"), "r", encoding="utf-8") as f:
+            record = json.load(f)
+        payload = None
+        if record.get("payload"):
+            with open(self._path(kind, record["payload"]), "rb") as f:
+                payload = f.read()
+
+        if self.latency == LATENCY_RECORDED:
+            time.sleep(record.get("elapsed", 0.0))
+        _, decode = _CODECS.get(kind, (_encode_json, _decode_json))
+        return decode(record["response"], payload)
+
+
+def configure_cassette(directory: Optional[str], mode: Optional[str], latency: str = LATENCY_ZERO) -> Optional[Cassette]:
+    """
+    Set up the process-wide cassette, or disable it when no mode is given.
+
+    Args:
+        directory (Optional[str]): Cassette directory.
+        mode (Optional[str]): "record", "replay" or None.
+        latency (str): Replay latency, "recorded" or "zero".
+
+    Returns:
+        Optional[Cassette]: The active cassette.
+    """
+    global _cassette
+    _cassette = Cassette(directory, mode, latency) if mode and directory else None
+    if _cassette is not None:
+        logger.info(f"Cassette {mode} mode enabled: {directory} (latency: {latency}).")
+    return _cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Get the active cassette.
+
+    Returns:
+        Optional[Cassette]: The active cassette, or None when recording/replay is off.
+    """
+    return _cassette
+
+
+def call_backend(kind: str, request: Any, live: Callable[[], Any], limiter: Optional[Any] = None) -> Any:
+    """
+    Call an external backend, recording or replaying it when a cassette is active.
+
+    Live and recorded calls go through the rate limiter; replayed calls bypass it
+    so offline runs measure only the agent's own overhead.
+
+    Args:
+        kind (str): Interaction kind, e.g. "llm", "bigquery_query", "bigquery_dry_run".
+        request (Any): JSON-serializable request description used as the replay key.
+        live (Callable[[], Any]): The live call.
+        limiter (Optional[Any]): Rate limiter for live calls.
+
+    Returns:
+        Any: The live or recorded result.
+    """
+    cassette = _cassette
+    if cassette is not None and cassette.replaying:
+        return cassette.replay(kind, request)
+    invoke = (lambda: cassette.record(kind, request, live)) if cassette is not None else live
+    return limiter.call(invoke) if limiter is not None else invoke()
+
+
+def describe_messages(messages: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Build a canonical, id-free description of chat messages for request keys.
+
+    Message ids are random per run and excluded; tool call ids come from recorded
+    responses and are kept.
+
+    Args:
+        messages (List[Any]): LangChain messages.
+
+    Returns:
+        List[Dict[str, Any]]: Canonical message descriptions.
+    """
+    described = []
+    for message in messages:
+        entry = {"type": message.type, "content": message.content}
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            entry["tool_calls"] = [
+                {"name": call["name"], "args": call["args"], "id": call.get("id")} for call in tool_calls
+            ]
+        if getattr(message, "tool_call_id", None):
+            entry["tool_call_id"] = message.tool_call_id
+        described.append(entry)
+    return described
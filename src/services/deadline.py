@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Iterator
+
+# Wall-clock deadline (time.time()) of the work running in the current context.
+# Tool calls run in executor threads that copy the context, so they see it too.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a wait would run past the deadline of the current question."""
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """
+    Set the deadline of the enclosed work.
+
+    Args:
+        deadline (Optional[float]): Wall-clock deadline as from time.time(), None for no deadline.
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """
+    Get the time left until the current deadline.
+
+    Returns:
+        Optional[float]: Seconds left, 0.0 once the deadline has passed, or None without a deadline.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.time())
@@ -6,47 +6,72 @@ from langchain_core.runnables import Runnable
 
 from src.config.app_config_loader import AppConfigLoader
 from src.config.env_config import EnvConfig
+from src.services.cassette import get_cassette
 
 logger = logging.getLogger(__name__)
 
 _llm: Optional[Runnable] = None
+_fast_llm: Optional[Runnable] = None
+_fallback_llm: Optional[Runnable] = None
+
+def _get_api_key() -> Optional[str]:
+    """
+    Get the Google API key, allowing it to be missing when LLM calls are replayed from a cassette.
+
+    Returns:
+        Optional[str]: The API key, or a placeholder in replay mode without a key.
+    """
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        # Replayed calls never reach the API; the placeholder only lets the client be built offline.
+        return EnvConfig(require_google_api_key=False).google_api_key or "replay-placeholder"
+    return EnvConfig().google_api_key
+
+def _create_chat_model(model_name: str) -> ChatGoogleGenerativeAI:
+    """
+    Create a chat model with the shared agent settings.
+
+    Args:
+        model_name (str): Name of the Gemini model.
+
+    Returns:
+        ChatGoogleGenerativeAI: The chat model.
+
+    Raises:
+        ValueError: If the Google API key is missing.
+    """
+    api_key: Optional[str] = _get_api_key()
+
+    if not api_key:
+        logger.error("Google API key is missing in the environment configuration.")
+        raise ValueError("Google API key is required to initialize the LLM.")
+
+    agent_config = AppConfigLoader().get_config().get("agent", {})
+    return ChatGoogleGenerativeAI(
+        model=model_name,
+        temperature=agent_config.get("temperature", 0.3),
+        api_key=api_key,
+        # Quota retries are paced by the shared rate limiter, keep client-side retries low.
+        max_retries=agent_config.get("llm_client_max_retries", 1),
+    )
 
 def _create_llm() -> Runnable:
     """
-    Create and configure the primary and fallback LLMs.
+    Create and configure the primary LLM.
+
+    The fallback model is a separate instance (see get_fallback_llm) so that each
+    model is called under its own rate limiter and a quota error of the primary
+    model is backed off instead of being absorbed by the fallback.
 
     Returns:
-        Runnable: A runnable LLM instance with fallbacks.
+        Runnable: A runnable LLM instance.
     """
     logger.info("Creating LLM instance.")
     try:
-        api_key: Optional[str] = EnvConfig().google_api_key
-
-        if not api_key:
-            logger.error("Google API key is missing in the environment configuration.")
-            raise ValueError("Google API key is required to initialize the LLM.")
-
-        config = AppConfigLoader().get_config()
-        agent_config = config.get("agent", {})
-        model_name = agent_config.get("llm_model", "gemini-2.5-pro")
-        fallback_model_name = agent_config.get("fallback_llm_model", "gemini-2.0-flash")
-        temperature = agent_config.get("temperature", 0.3)
-
-        primary_llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            temperature=temperature,
-            api_key=api_key,
-        )
-
-        fallback_llm = ChatGoogleGenerativeAI(
-            model=fallback_model_name,
-            temperature=temperature,
-            api_key=api_key,
-        )
-
+        agent_config = AppConfigLoader().get_config().get("agent", {})
+        primary_llm = _create_chat_model(agent_config.get("llm_model", "gemini-2.5-pro"))
         logger.info("LLM instance created successfully.")
-
-        return primary_llm.with_fallbacks([fallback_llm])
+        return primary_llm
 
     except Exception as e:
         logger.error(f"Failed to create LLM instance: {e}", exc_info=True)
@@ -63,4 +88,70 @@ def get_llm() -> Runnable:
     if _llm is None:
         logger.info("Initializing shared LLM instance.")
         _llm = _create_llm() 
-    return _llm
\ No newline at end of file
+    return _llm
+
+
+def _create_fallback_llm() -> Runnable:
+    """
+    Create the fallback LLM used when the primary model fails.
+
+    Returns:
+        Runnable: A runnable LLM instance.
+    """
+    logger.info("Creating fallback LLM instance.")
+    try:
+        agent_config = AppConfigLoader().get_config().get("agent", {})
+        fallback_llm = _create_chat_model(agent_config.get("fallback_llm_model", "gemini-2.0-flash"))
+        logger.info("Fallback LLM instance created successfully.")
+        return fallback_llm
+
+    except Exception as e:
+        logger.error(f"Failed to create fallback LLM instance: {e}", exc_info=True)
+        raise
+
+def get_fallback_llm() -> Runnable:
+    """
+    Retrieve the shared fallback LLM instance, creating it if necessary.
+
+    Returns:
+        Runnable: The shared fallback LLM instance.
+    """
+    global _fallback_llm
+    if _fallback_llm is None:
+        logger.info("Initializing shared fallback LLM instance.")
+        _fallback_llm = _create_fallback_llm()
+    return _fallback_llm
+
+
+def _create_fast_llm() -> Runnable:
+    """
+    Create the faster model used when a question's budget is running low.
+
+    Returns:
+        Runnable: A runnable LLM instance.
+    """
+    logger.info("Creating fast LLM instance.")
+    try:
+        agent_config = AppConfigLoader().get_config().get("agent", {})
+        model_name = agent_config.get("fast_llm_model", agent_config.get("fallback_llm_model", "gemini-2.0-flash"))
+        fast_llm = _create_chat_model(model_name)
+
+        logger.info("Fast LLM instance created successfully.")
+        return fast_llm
+
+    except Exception as e:
+        logger.error(f"Failed to create fast LLM instance: {e}", exc_info=True)
+        raise
+
+def get_fast_llm() -> Runnable:
+    """
+    Retrieve the shared fast LLM instance, creating it if necessary.
+
+    Returns:
+        Runnable: The shared fast LLM instance.
+    """
+    global _fast_llm
+    if _fast_llm is None:
+        logger.info("Initializing shared fast LLM instance.")
+        _fast_llm = _create_fast_llm()
+    return _fast_llm
\ No newline at end of file
@@ -0,0 +1,240 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _StackSampler(threading.Thread):
+    """
+    Background thread sampling the stacks of all other threads at a fixed interval.
+
+    cProfile only sees the thread that enabled it, while tool calls run in the
+    graph's worker threads, so the sampler provides the cross-thread view used
+    for flamegraphs.
+
+    Attributes:
+        interval (float): Seconds between samples.
+        stacks (Counter): Collapsed stack string to sample count.
+        cpu_seconds (float): CPU time the sampler itself used, set once it has stopped.
+    """
+
+    def __init__(self, interval: float) -> None:
+        """
+        Initialize the sampler.
+
+        Args:
+            interval (float): Seconds between samples.
+        """
+        super().__init__(name="turn-profiler-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.cpu_seconds = 0.0
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _frame_label(frame: Any) -> str:
+        """
+        Format a frame as "module:function".
+
+        Args:
+            frame (Any): A Python frame object.
+
+        Returns:
+            str: The frame label.
+        """
+        module = frame.f_globals.get("__name__", os.path.basename(frame.f_code.co_filename))
+        return f"{module}:{frame.f_code.co_name}"
+
+    def run(self) -> None:
+        """
+        Sample until stopped.
+        """
+        own_id = threading.get_ident()
+        cpu_start = time.thread_time()
+        names = {}
+        try:
+            self._sample(own_id, names)
+        finally:
+            self.cpu_seconds = time.thread_time() - cpu_start
+
+    def _sample(self, own_id: int, names: dict) -> None:
+        """
+        Take samples until stopped.
+
+        Args:
+            own_id (int): Thread id of the sampler, excluded from the samples.
+            names (dict): Cache of thread id to thread name.
+        """
+        while not self._stop_event.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels: List[str] = []
+                while frame is not None:
+                    labels.append(self._frame_label(frame))
+                    frame = frame.f_back
+                thread_name = names.get(thread_id, str(thread_id)).split("_")[0]
+                self.stacks[";".join([thread_name] + labels[::-1])] += 1
+
+    def stop(self) -> None:
+        """
+        Stop sampling and wait for the thread to finish.
+        """
+        self._stop_event.set()
+        self.join()
+
+
+class TurnProfiler:
+    """
+    Profile agent turns and write per-turn artifacts.
+
+    For every profiled turn it writes a pstats file (deterministic profile of
+    the calling thread), a collapsed-stack file for flamegraph tools (sampled
+    across all threads) and prints a top-N hotspot summary with the split
+    between CPU time and wall-clock wait. CPU is reported for the whole process
+    (every thread, including prefetch and tool threads) without the sampler's
+    own CPU, and separately for the calling thread.
+
+    Attributes:
+        output_dir (str): Directory for profile artifacts.
+        top_n (int): Number of hotspots shown in the console summary.
+        sample_interval (float): Seconds between stack samples.
+    """
+
+    def __init__(self, output_dir: str = "profiles", top_n: int = 15, sample_interval: float = 0.005) -> None:
+        """
+        Initialize the profiler.
+
+        Args:
+            output_dir (str): Directory for profile artifacts.
+            top_n (int): Number of hotspots shown in the console summary.
+            sample_interval (float): Seconds between stack samples.
+        """
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self._turn = 0
+
+    @contextmanager
+    def profile_turn(self, label: str = "turn") -> Iterator[None]:
+        """
+        Profile the enclosed block as one turn.
+
+        Args:
+            label (str): Prefix of the artifact file names.
+        """
+        self._turn += 1
+        os.makedirs(self.output_dir, exist_ok=True)
+        base_path = os.path.join(self.output_dir, f"{label}-{self._turn:04d}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+        profile = cProfile.Profile()
+        sampler = _StackSampler(self.sample_interval)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        thread_cpu_start = time.thread_time()
+        sampler.start()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - wall_start
+            thread_cpu = time.thread_time() - thread_cpu_start
+            sampler.stop()
+            # The sampler has stopped, so its CPU is final and can be taken out of the process total.
+            process_cpu = max(0.0, time.process_time() - cpu_start - sampler.cpu_seconds)
+            cpu = {"process": process_cpu, "thread": thread_cpu, "sampler": sampler.cpu_seconds}
+            try:
+                self._write_artifacts(base_path, profile, sampler.stacks, wall, cpu)
+            except Exception as e:
+                logger.error(f"Failed to write profile artifacts: {e}", exc_info=True)
+
+    def _write_artifacts(
+        self,
+        base_path: str,
+        profile: cProfile.Profile,
+        stacks: Counter,
+        wall: float,
+        cpu: Dict[str, float],
+    ) -> None:
+        """
+        Write pstats and collapsed-stack files and print the hotspot summary.
+
+        Args:
+            base_path (str): Artifact path without extension.
+            profile (cProfile.Profile): The finished deterministic profile.
+            stacks (Counter): Sampled collapsed stacks.
+            wall (float): Wall-clock seconds of the turn.
+            cpu (Dict[str, float]): CPU seconds of the turn: "process" (sampler excluded), "thread" and "sampler".
+        """
+        pstats_path = f"{base_path}.pstats"
+        collapsed_path = f"{base_path}.collapsed"
+        profile.dump_stats(pstats_path)
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Profile artifacts written: {pstats_path}, {collapsed_path}")
+
+        print(self.format_summary(pstats.Stats(pstats_path), stacks, wall, cpu, pstats_path, collapsed_path))
+
+    def format_summary(
+        self,
+        stats: pstats.Stats,
+        stacks: Counter,
+        wall: float,
+        cpu: Dict[str, float],
+        pstats_path: str,
+        collapsed_path: str,
+    ) -> str:
+        """
+        Build the console summary of a profiled turn.
+
+        Args:
+            stats (pstats.Stats): Loaded deterministic profile.
+            stacks (Counter): Sampled collapsed stacks.
+            wall (float): Wall-clock seconds of the turn.
+            cpu (Dict[str, float]): CPU seconds of the turn: "process" (sampler excluded), "thread" and "sampler".
+            pstats_path (str): Path of the pstats artifact.
+            collapsed_path (str): Path of the collapsed-stack artifact.
+
+        Returns:
+            str: The summary text.
+        """
+        # Calling-thread CPU vs wall; process CPU can exceed wall when threads run in parallel.
+        wait = max(0.0, wall - cpu["thread"])
+        lines = [
+            "================================ Turn Profile ==================================",
+            f"Wall: {wall:.3f}s | Calling thread CPU: {cpu['thread']:.3f}s | "
+            f"Calling thread wait (I/O, sleeps, locks): {wait:.3f}s",
+            f"Process CPU (all threads, sampler excluded): {cpu['process']:.3f}s | Sampler CPU: {cpu['sampler']:.3f}s",
+            f"Artifacts: {pstats_path} | {collapsed_path}",
+            "",
+            f"Top {self.top_n} functions by self time (calling thread):",
+        ]
+        entries: List[Tuple[float, float, int, str]] = []
+        for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            entries.append((tottime, cumtime, calls, f"{os.path.basename(filename)}:{line}({func})"))
+        for tottime, cumtime, calls, name in sorted(entries, reverse=True)[: self.top_n]:
+            lines.append(f"  {tottime:8.3f}s self {cumtime:8.3f}s cum {calls:8d} calls  {name}")
+
+        total_samples = sum(stacks.values())
+        if total_samples:
+            leaves: Counter = Counter()
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            lines.append("")
+            lines.append(f"Top {self.top_n} sampled leaf frames (all threads, {total_samples} samples):")
+            for frame, count in leaves.most_common(self.top_n):
+                lines.append(f"  {100 * count / total_samples:6.1f}%  {frame}")
+        lines.append("================================================================================")
+        return "\n".join(lines)
@@ -0,0 +1,387 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple, TypeVar
+
+from src.config.app_config_loader import AppConfigLoader
+from src.services.deadline import DeadlineExceeded, remaining_seconds
+from src.services.scheduler import priority_rank
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error reasons (BigQuery `errors[].reason`) of rate limits that clear up on their own.
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "jobRateLimitExceeded", "RATE_LIMIT_EXCEEDED"}
+# Quotas that do not recover within a retry window, e.g. the daily free bytes scanned.
+_HARD_QUOTA_REASONS = {"quotaExceeded", "billingNotEnabled", "accessDenied"}
+
+_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "llm": {
+        "requests_per_second": 1.0,
+        "burst": 2,
+        "max_concurrency": 2,
+    },
+    "bigquery_jobs": {
+        "requests_per_second": 5.0,
+        "burst": 10,
+        "max_concurrency": 8,
+    },
+    "bigquery_dry_runs": {
+        "requests_per_second": 10.0,
+        "burst": 20,
+        "max_concurrency": 16,
+    },
+    "bigquery_metadata": {
+        "requests_per_second": 10.0,
+        "burst": 20,
+        "max_concurrency": 8,
+    },
+}
+
+_LIMITERS: Dict[str, "RateLimiter"] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """
+    Get the HTTP status of an API error, if it carries one.
+
+    Args:
+        error (BaseException): The exception.
+
+    Returns:
+        Optional[int]: The status code, or None.
+    """
+    for value in (
+        getattr(error, "code", None),
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return int(value)
+    return None
+
+
+def _error_reasons(error: BaseException) -> set:
+    """
+    Get the error reasons of a Google API error (e.g. "rateLimitExceeded").
+
+    Args:
+        error (BaseException): The exception.
+
+    Returns:
+        set: The reasons, empty if the error has none.
+    """
+    reasons = set()
+    for detail in getattr(error, "errors", None) or []:
+        if isinstance(detail, dict) and detail.get("reason"):
+            reasons.add(detail["reason"])
+    reason = getattr(error, "reason", None)
+    if isinstance(reason, str) and reason:
+        reasons.add(reason)
+    return reasons
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """
+    Check whether an exception signals a transient rate-limit rejection.
+
+    Errors are classified by HTTP status (429) and API error reason, following
+    wrapped causes; hard quotas such as the daily free bytes scanned are not
+    transient and are not backed off.
+
+    Args:
+        error (BaseException): The exception raised by the LLM or BigQuery client.
+
+    Returns:
+        bool: True if the error is a rate-limit error that should be backed off and retried.
+    """
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        reasons = _error_reasons(current)
+        if reasons & _HARD_QUOTA_REASONS:
+            return False
+        if _status_code(current) == 429 or reasons & _RATE_LIMIT_REASONS:
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+class RateLimiter:
+    """
+    Token-bucket and concurrency limiter for a single shared resource.
+
+    Callers queue on the limiter instead of calling the resource directly. When the
+    resource answers with a quota error, the limiter halves its refill rate and pauses
+    all callers for a backoff period, so bursts turn into queuing rather than a wave
+    of independent retries. The rate recovers gradually after successful calls.
+    Waits and retries end at the deadline of the current question (see
+    src.services.deadline) instead of running past it. Queued callers are served
+    in scheduler priority order (see src.services.scheduler.priority_scope), then
+    first come first served, so a batch backlog does not delay interactive calls.
+
+    Attributes:
+        name (str): Name of the limited resource, used in logs and metrics.
+        requests_per_second (float): Configured steady-state refill rate.
+        burst (int): Maximum number of tokens the bucket can hold.
+        max_concurrency (int): Maximum number of calls in flight at once.
+        max_retries (int): Retries on quota errors before the error is re-raised.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        max_concurrency: int = 1,
+        max_retries: int = 3,
+        initial_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 30.0,
+        backoff_multiplier: float = 2.0,
+        min_rate_fraction: float = 0.1,
+        recovery_factor: float = 1.1,
+    ) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            name (str): Name of the limited resource.
+            requests_per_second (float): Steady-state refill rate of the bucket; 0 or less disables
+                the bucket so only concurrency is limited.
+            burst (int): Bucket capacity.
+            max_concurrency (int): Maximum number of calls in flight at once.
+            max_retries (int): Retries on quota errors before giving up.
+            initial_backoff_seconds (float): First pause after a quota error.
+            max_backoff_seconds (float): Upper bound for the pause.
+            backoff_multiplier (float): Growth factor of the pause on consecutive quota errors.
+            min_rate_fraction (float): Lowest fraction of the configured rate the limiter may adapt down to.
+            recovery_factor (float): Multiplier applied to the rate after each successful call.
+        """
+        self.name = name
+        self.requests_per_second = float(requests_per_second)
+        self.burst = max(1, int(burst))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.initial_backoff_seconds = float(initial_backoff_seconds)
+        self.max_backoff_seconds = float(max_backoff_seconds)
+        self.backoff_multiplier = float(backoff_multiplier)
+        self.min_rate = self.requests_per_second * float(min_rate_fraction)
+        self.recovery_factor = float(recovery_factor)
+
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._rate = self.requests_per_second
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._backoff = self.initial_backoff_seconds
+
+        self._in_flight = 0
+        self._seq = itertools.count()
+        self._queue: List[Tuple[int, int]] = []
+        self._max_queue_depth = 0
+        self._acquired = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _refill(self, now: float) -> None:
+        """
+        Add tokens accumulated since the last refill. Must hold the lock.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self._rate)
+            self._last_refill = now
+
+    def acquire(self, priority: Optional[str] = None) -> float:
+        """
+        Block until a token and a concurrency slot are available.
+
+        Args:
+            priority (Optional[str]): Scheduler priority class of the call, None for the
+                class of the current context.
+
+        Returns:
+            float: Seconds spent waiting in the queue.
+
+        Raises:
+            DeadlineExceeded: If the current deadline passes while waiting.
+        """
+        start = time.monotonic()
+        remaining = remaining_seconds()
+        deadline = None if remaining is None else start + remaining
+        ticket = (priority_rank(priority), next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._queue[0] != ticket:
+                        # Callers of a higher class, or earlier ones of the same class, go first.
+                        wait = None
+                    elif now < self._paused_until:
+                        wait = self._paused_until - now
+                    elif self._in_flight >= self.max_concurrency:
+                        wait = None
+                    elif self.requests_per_second > 0 and self._tokens < 1.0:
+                        wait = (1.0 - self._tokens) / max(self._rate, 1e-6)
+                    else:
+                        if self.requests_per_second > 0:
+                            self._tokens -= 1.0
+                        self._in_flight += 1
+                        break
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise DeadlineExceeded(f"Deadline reached while queued on rate limiter '{self.name}'.")
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self._acquired += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+        if waited > 0.01:
+            logger.debug(f"Rate limiter '{self.name}' queued a call for {waited:.2f}s.")
+        return waited
+
+    def release(self, throttled: bool = False) -> None:
+        """
+        Release a concurrency slot and adapt the rate to the call outcome.
+
+        Args:
+            throttled (bool): Whether the call was rejected with a quota error.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self._throttled += 1
+                self._rate = max(self.min_rate, self._rate / 2)
+                self._paused_until = max(self._paused_until, now + self._backoff)
+                self._tokens = 0.0
+                logger.warning(
+                    f"Rate limiter '{self.name}' hit a quota error; pausing for {self._backoff:.1f}s "
+                    f"and lowering rate to {self._rate:.2f}/s."
+                )
+                self._backoff = min(self.max_backoff_seconds, self._backoff * self.backoff_multiplier)
+            else:
+                self._rate = min(self.requests_per_second, self._rate * self.recovery_factor)
+                if now >= self._paused_until:
+                    self._backoff = self.initial_backoff_seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Context manager that holds a limiter slot for the duration of a call.
+        Quota errors raised inside the block trigger adaptive backoff.
+        """
+        self.acquire()
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_quota_error(e)
+            raise
+        finally:
+            self.release(throttled=throttled)
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Call a function under the limiter, retrying quota errors after the shared backoff.
+
+        Args:
+            func (Callable[..., T]): The function calling the limited resource.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            T: The function's return value.
+
+        Raises:
+            Exception: The last error if retries are exhausted or the error is not a quota error.
+            DeadlineExceeded: If the current deadline passes while waiting for a slot or a retry.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.slot():
+                    return func(*args, **kwargs)
+            except Exception as e:
+                if not is_quota_error(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logger.info(f"Retrying '{self.name}' call after quota error (attempt {attempt}/{self.max_retries}).")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of the limiter's queue and throttling metrics.
+
+        Returns:
+            Dict[str, Any]: Metrics for the limiter.
+        """
+        with self._cond:
+            return {
+                "name": self.name,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "in_flight": self._in_flight,
+                "acquired": self._acquired,
+                "throttled": self._throttled,
+                "avg_wait_seconds": self._total_wait / self._acquired if self._acquired else 0.0,
+                "max_wait_seconds": self._max_wait,
+                "current_rate": self._rate,
+            }
+
+
+def get_rate_limiter(resource: str, key: Optional[str] = None) -> RateLimiter:
+    """
+    Return the process-wide limiter for a resource, creating it from config on first use.
+
+    Settings are read from the `rate_limits.<resource>` section of app-config.yaml.
+
+    Args:
+        resource (str): Resource kind: "llm", "bigquery_jobs", "bigquery_dry_runs" or "bigquery_metadata".
+        key (Optional[str]): Sub-key such as the LLM model name; each key gets its own limiter.
+
+    Returns:
+        RateLimiter: The shared limiter.
+    """
+    name = f"{resource}:{key}" if key else resource
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(name)
+        if limiter is None:
+            settings = dict(_DEFAULTS.get(resource, {}))
+            settings.update(AppConfigLoader().get_config().get("rate_limits", {}).get(resource, {}) or {})
+            logger.info(f"Creating rate limiter '{name}' with settings: {settings}")
+            limiter = RateLimiter(name=name, **settings)
+            _LIMITERS[name] = limiter
+        return limiter
+
+
+def get_rate_limiter_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Get metrics for all limiters created so far.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Metrics keyed by limiter name.
+    """
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return {limiter.name: limiter.metrics() for limiter in limiters}
@@ -0,0 +1,166 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+import pandas as pd
+
+from src.config.app_config_loader import AppConfigLoader
+
+logger = logging.getLogger(__name__)
+
+# (project_id, dataset_id) a result was produced for.
+Scope = Tuple[Optional[str], Optional[str]]
+
+_store: Optional["ResultStore"] = None
+_store_lock = threading.Lock()
+
+
+class ResultStore:
+    """
+    In-memory store of completed query results, addressed by short-lived handles.
+
+    Lets the agent page through, project or sort a result it already paid for
+    without re-running the query. Handles expire after a TTL and the least
+    recently used results are evicted once the memory cap is reached. Each
+    result belongs to the project and dataset that produced it and is only
+    served to sessions of the same project and dataset.
+
+    Attributes:
+        ttl_seconds (float): Lifetime of a handle since it was last used.
+        max_bytes (int): Memory cap for all stored results.
+        max_handles (int): Maximum number of stored results.
+    """
+
+    def __init__(self, ttl_seconds: float = 900, max_bytes: int = 256 * 1024 * 1024, max_handles: int = 50) -> None:
+        """
+        Initialize the result store.
+
+        Args:
+            ttl_seconds (float): Lifetime of a handle since it was last used.
+            max_bytes (int): Memory cap for all stored results.
+            max_handles (int): Maximum number of stored results.
+        """
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_bytes = int(max_bytes)
+        self.max_handles = int(max_handles)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, int, float, Scope]]" = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def make_handle(key: str, scope: Scope) -> str:
+        """
+        Derive a stable handle from the query identity, so re-running a query refreshes its handle.
+
+        Args:
+            key (str): Identity of the result, e.g. the normalized SQL.
+            scope (Scope): Project and dataset the result was produced for.
+
+        Returns:
+            str: The result handle.
+        """
+        project_id, dataset_id = scope
+        identity = f"{project_id or ''}\n{dataset_id or ''}\n{key}"
+        return "qr_" + hashlib.sha256(identity.encode("utf-8")).hexdigest()[:12]
+
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired entries, then least recently used ones above the caps. Must hold the lock.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        for handle in [h for h, (_, _, used, _) in self._entries.items() if now - used > self.ttl_seconds]:
+            _, size, _, _ = self._entries.pop(handle)
+            self._bytes -= size
+            logger.info(f"Result handle {handle} expired.")
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_handles):
+            handle, (_, size, _, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            logger.info(f"Result handle {handle} evicted to respect memory cap.")
+
+    def put(self, key: str, df: pd.DataFrame, scope: Scope) -> Optional[str]:
+        """
+        Store a result and return its handle.
+
+        Args:
+            key (str): Identity of the result, e.g. the normalized SQL.
+            df (pd.DataFrame): The full query result.
+            scope (Scope): Project and dataset the result was produced for.
+
+        Returns:
+            Optional[str]: The handle, or None if the result alone exceeds the memory cap.
+        """
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            logger.warning(f"Result of {size} bytes exceeds the result store cap; not keeping a handle.")
+            return None
+
+        handle = self.make_handle(key, scope)
+        now = time.monotonic()
+        with self._lock:
+            previous = self._entries.pop(handle, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[handle] = (df, size, now, scope)
+            self._bytes += size
+            self._evict(now)
+        logger.info(f"Stored result handle {handle} ({len(df)} rows, {size} bytes).")
+        return handle
+
+    def get(self, handle: str, scope: Scope) -> pd.DataFrame:
+        """
+        Look up a stored result and refresh its expiry.
+
+        Args:
+            handle (str): The result handle.
+            scope (Scope): Project and dataset of the requesting session.
+
+        Returns:
+            pd.DataFrame: The stored result.
+
+        Raises:
+            KeyError: If the handle is unknown, expired, evicted or belongs to another project or dataset.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(handle)
+            if entry is None or entry[3] != scope:
+                raise KeyError(f"Result handle '{handle}' is unknown or has expired. Re-run the query.")
+            df, size, _, _ = self._entries.pop(handle)
+            self._entries[handle] = (df, size, now, scope)
+            return df
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the number of stored results and their memory usage.
+
+        Returns:
+            Dict[str, Any]: Store statistics.
+        """
+        with self._lock:
+            return {"handles": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+def get_result_store() -> ResultStore:
+    """
+    Retrieve the shared result store, creating it from the `result_handles` config section.
+
+    Returns:
+        ResultStore: The shared result store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            settings = AppConfigLoader().get_config().get("result_handles", {}) or {}
+            logger.info("Initializing shared result store.")
+            _store = ResultStore(
+                ttl_seconds=settings.get("ttl_seconds", 900),
+                max_bytes=settings.get("max_bytes", 256 * 1024 * 1024),
+                max_handles=settings.get("max_handles", 50),
+            )
+        return _store
@@ -0,0 +1,195 @@
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from google.cloud import bigquery
+
+from src.config.app_config_loader import AppConfigLoader
+from src.services.big_query_runner import BigQueryRunner
+from src.services.cassette import get_cassette
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional["RunnerPool"] = None
+_pool_lock = threading.Lock()
+
+
+class RunnerPool:
+    """
+    Thread-safe pool of BigQueryRunners keyed by (project, dataset).
+
+    Runners of the same project share one BigQuery client, and all clients share
+    one authorized HTTP session with a sized connection pool, so a warm process can
+    serve several datasets without rebuilding clients per request. Runners idle for
+    longer than the TTL are evicted, together with clients no runner uses anymore.
+
+    Attributes:
+        idle_ttl_seconds (float): Idle time after which a runner is evicted.
+        max_connections (int): Size of the shared HTTP connection pool.
+        schema_cache_ttl_seconds (float): Schema cache lifetime of the pooled runners.
+        speculation_ttl_seconds (float): Lifetime of prefetched results in the pooled runners.
+    """
+
+    def __init__(
+        self,
+        idle_ttl_seconds: float = 1800,
+        max_connections: int = 32,
+        schema_cache_ttl_seconds: float = 3600,
+        speculation_ttl_seconds: float = 300,
+    ) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            idle_ttl_seconds (float): Idle time after which a runner is evicted.
+            max_connections (int): Size of the shared HTTP connection pool.
+            schema_cache_ttl_seconds (float): Schema cache lifetime of the pooled runners.
+            speculation_ttl_seconds (float): Lifetime of prefetched results in the pooled runners.
+        """
+        self.idle_ttl_seconds = float(idle_ttl_seconds)
+        self.max_connections = int(max_connections)
+        self.schema_cache_ttl_seconds = float(schema_cache_ttl_seconds)
+        self.speculation_ttl_seconds = float(speculation_ttl_seconds)
+        self._lock = threading.Lock()
+        self._runners: Dict[Tuple[Optional[str], str], Tuple[BigQueryRunner, float]] = {}
+        self._clients: Dict[Optional[str], bigquery.Client] = {}
+        self._credentials: Any = None
+        self._session: Any = None
+
+    def _http_session(self) -> Any:
+        """
+        Create the shared authorized HTTP session on first use. Must hold the lock.
+
+        Returns:
+            Any: An AuthorizedSession with a connection pool of max_connections.
+        """
+        if self._session is None:
+            import google.auth
+            from google.auth.transport.requests import AuthorizedSession
+            from requests.adapters import HTTPAdapter
+
+            logger.info(f"Creating shared BigQuery HTTP session with {self.max_connections} pooled connections.")
+            self._credentials, _ = google.auth.default(scopes=list(bigquery.Client.SCOPE))
+            self._session = AuthorizedSession(self._credentials)
+            adapter = HTTPAdapter(pool_connections=self.max_connections, pool_maxsize=self.max_connections)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def _client(self, project_id: Optional[str]) -> Optional[bigquery.Client]:
+        """
+        Get or create the shared client of a project. Must hold the lock.
+
+        Args:
+            project_id (Optional[str]): GCP project ID.
+
+        Returns:
+            Optional[bigquery.Client]: The client, or None when replaying a cassette.
+        """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return None
+        if project_id not in self._clients:
+            session = self._http_session()
+            logger.info(f"Creating BigQuery client for project: {project_id}")
+            self._clients[project_id] = bigquery.Client(
+                project=project_id, credentials=self._credentials, _http=session
+            )
+        return self._clients[project_id]
+
+    def _evict_idle(self, now: float) -> None:
+        """
+        Drop idle runners and clients no longer used by any runner. Must hold the lock.
+
+        Args:
+            now (float): Current monotonic time.
+        """
+        for key in [k for k, (_, used) in self._runners.items() if now - used > self.idle_ttl_seconds]:
+            del self._runners[key]
+            logger.info(f"Evicted idle BigQueryRunner for {key}.")
+        in_use = {project for project, _ in self._runners}
+        for project in [p for p in self._clients if p not in in_use]:
+            # The HTTP session is shared, so the client is dropped without closing it.
+            del self._clients[project]
+            logger.info(f"Released BigQuery client for project: {project}")
+
+    def get(self, project_id: Optional[str], dataset_id: str) -> BigQueryRunner:
+        """
+        Get the runner for a project and dataset, creating it if needed.
+
+        Args:
+            project_id (Optional[str]): GCP project ID billed for the queries.
+            dataset_id (str): Dataset ID in the form 'project.dataset'.
+
+        Returns:
+            BigQueryRunner: The pooled runner.
+        """
+        key = (project_id, dataset_id)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._runners.get(key)
+            if entry is None:
+                logger.info(f"Creating pooled BigQueryRunner for {key}.")
+                runner = BigQueryRunner(
+                    project_id=project_id,
+                    dataset_id=dataset_id,
+                    client=self._client(project_id),
+                    schema_cache_ttl_seconds=self.schema_cache_ttl_seconds,
+                    speculation_ttl_seconds=self.speculation_ttl_seconds,
+                )
+            else:
+                runner = entry[0]
+            self._runners[key] = (runner, now)
+            return runner
+
+    def add(self, runner: BigQueryRunner) -> None:
+        """
+        Pool an existing runner under its project and dataset, replacing any pooled one.
+
+        Args:
+            runner (BigQueryRunner): The runner, e.g. one built on a fake client for load tests.
+        """
+        with self._lock:
+            self._runners[(runner.project_id, runner.dataset_id)] = (runner, time.monotonic())
+
+    def runners(self) -> List[BigQueryRunner]:
+        """
+        Get all pooled runners.
+
+        Returns:
+            List[BigQueryRunner]: The runners currently in the pool.
+        """
+        with self._lock:
+            return [runner for runner, _ in self._runners.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the number of pooled runners and clients.
+
+        Returns:
+            Dict[str, Any]: Pool statistics.
+        """
+        with self._lock:
+            return {"runners": len(self._runners), "clients": len(self._clients)}
+
+
+def get_runner_pool() -> RunnerPool:
+    """
+    Retrieve the shared runner pool, creating it from the `bigquery.pool` config section.
+
+    Returns:
+        RunnerPool: The shared runner pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = AppConfigLoader().get_config().get("bigquery", {}).get("pool", {}) or {}
+            logger.info("Initializing shared BigQuery runner pool.")
+            _pool = RunnerPool(
+                idle_ttl_seconds=settings.get("idle_ttl_seconds", 1800),
+                max_connections=settings.get("max_connections", 32),
+                schema_cache_ttl_seconds=settings.get("schema_cache_ttl_seconds", 3600),
+                speculation_ttl_seconds=settings.get("speculation_ttl_seconds", 300),
+            )
+        return _pool
@@ -0,0 +1,305 @@
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from src.config.app_config_loader import AppConfigLoader
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_PREFETCH = "prefetch"
+# Highest priority first.
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_PREFETCH)
+
+_scheduler: Optional["PriorityScheduler"] = None
+_scheduler_lock = threading.Lock()
+
+# Priority class of the work running in the current context, so shared rate
+# limiters can serve their queue in class order too.
+_priority: ContextVar[Optional[str]] = ContextVar("priority", default=None)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of a list of samples.
+
+    Args:
+        samples (List[float]): The samples.
+        fraction (float): Percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The percentile, or 0.0 without samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class _Waiter:
+    """A queued slot request."""
+
+    __slots__ = ("priority", "session_id", "tag", "seq", "enqueued")
+
+    def __init__(self, priority: str, session_id: str, tag: float, seq: int) -> None:
+        self.priority = priority
+        self.session_id = session_id
+        self.tag = tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+
+class PriorityScheduler:
+    """
+    Hands out a fixed number of execution slots by priority class and session.
+
+    Classes are served in strict priority order (interactive, batch, prefetch).
+    Within a class, sessions share slots by start-time fair queuing: every
+    request is tagged with max(class virtual time, the session's last finish
+    tag) and the smallest tag is served first, so a session with a hundred
+    queued steps cannot starve one with a single step. Callers hold a slot for
+    one unit of work (a graph node), which makes every node boundary a
+    preemption point for higher-priority work.
+
+    Attributes:
+        max_concurrency (int): Number of slots.
+        wait_samples (int): Queue wait samples kept per class for the percentiles.
+    """
+
+    def __init__(self, max_concurrency: int = 4, wait_samples: int = 1000) -> None:
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency (int): Number of slots.
+            wait_samples (int): Queue wait samples kept per class for the percentiles.
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.wait_samples = int(wait_samples)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._seq = itertools.count()
+        self._waiters: List[_Waiter] = []
+        self._virtual_time: Dict[str, float] = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._finish: Dict[Tuple[str, str], float] = {}
+        self._waits: Dict[str, deque] = {cls: deque(maxlen=self.wait_samples) for cls in PRIORITY_CLASSES}
+        self._granted: Dict[str, int] = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._timeouts: Dict[str, int] = {cls: 0 for cls in PRIORITY_CLASSES}
+
+    def _next(self) -> Optional[_Waiter]:
+        """
+        Pick the waiter to serve next. Must hold the lock.
+
+        Returns:
+            Optional[_Waiter]: The waiter, or None when nobody waits.
+        """
+        for cls in PRIORITY_CLASSES:
+            candidates = [w for w in self._waiters if w.priority == cls]
+            if candidates:
+                return min(candidates, key=lambda w: (w.tag, w.seq))
+        return None
+
+    def _grant(self, waiter: _Waiter) -> None:
+        """
+        Give a slot to a waiter and advance its class's virtual time. Must hold the lock.
+
+        Args:
+            waiter (_Waiter): The waiter being served.
+        """
+        self._waiters.remove(waiter)
+        self._in_use += 1
+        cls = waiter.priority
+        self._virtual_time[cls] = max(self._virtual_time[cls], waiter.tag)
+        self._granted[cls] += 1
+        self._waits[cls].append(time.monotonic() - waiter.enqueued)
+        # Sessions whose last finish tag is behind the virtual time start fresh anyway.
+        for key in [k for k, tag in self._finish.items() if k[0] == cls and tag <= self._virtual_time[cls]]:
+            del self._finish[key]
+
+    def acquire(self, priority: str, session_id: str, weight: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a slot.
+
+        Args:
+            priority (str): Priority class: "interactive", "batch" or "prefetch".
+            session_id (str): Session the work belongs to.
+            weight (float): Share of the session relative to others in its class.
+            timeout (Optional[float]): Maximum seconds to wait, None to wait indefinitely.
+
+        Returns:
+            bool: True if a slot was acquired, False on timeout.
+
+        Raises:
+            ValueError: If the priority class is unknown.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            key = (priority, session_id)
+            start = max(self._virtual_time[priority], self._finish.get(key, 0.0))
+            self._finish[key] = start + 1.0 / max(weight, 1e-6)
+            waiter = _Waiter(priority, session_id, start, next(self._seq))
+            self._waiters.append(waiter)
+            while not (self._in_use < self.max_concurrency and self._next() is waiter):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiters.remove(waiter)
+                    self._timeouts[priority] += 1
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(remaining)
+            self._grant(waiter)
+            return True
+
+    def release(self) -> None:
+        """
+        Return a slot and wake the waiters.
+        """
+        with self._cond:
+            self._in_use = max(0, self._in_use - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(
+        self,
+        priority: str,
+        session_id: str,
+        weight: float = 1.0,
+        timeout: Optional[float] = None,
+    ) -> Iterator[bool]:
+        """
+        Hold a slot for the enclosed block.
+
+        Args:
+            priority (str): Priority class.
+            session_id (str): Session the work belongs to.
+            weight (float): Share of the session relative to others in its class.
+            timeout (Optional[float]): Maximum seconds to wait, None to wait indefinitely.
+
+        Yields:
+            bool: Whether a slot was acquired; the block runs without one on timeout.
+        """
+        acquired = self.acquire(priority, session_id, weight, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get queue wait metrics per priority class.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per class: queued requests, granted slots,
+            timeouts and queue wait p50/p95/max in seconds over recent requests.
+        """
+        with self._cond:
+            metrics = {}
+            for cls in PRIORITY_CLASSES:
+                waits = list(self._waits[cls])
+                metrics[cls] = {
+                    "queued": sum(1 for w in self._waiters if w.priority == cls),
+                    "granted": self._granted[cls],
+                    "timeouts": self._timeouts[cls],
+                    "wait_p50_seconds": percentile(waits, 0.50),
+                    "wait_p95_seconds": percentile(waits, 0.95),
+                    "wait_max_seconds": max(waits, default=0.0),
+                }
+            metrics["in_use"] = {"slots": self._in_use, "max_concurrency": self.max_concurrency}
+            return metrics
+
+
+@contextmanager
+def priority_scope(priority: str) -> Iterator[None]:
+    """
+    Set the priority class of the enclosed work.
+
+    Args:
+        priority (str): Priority class: "interactive", "batch" or "prefetch".
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def priority_rank(priority: Optional[str] = None) -> int:
+    """
+    Rank a priority class, 0 being served first.
+
+    Args:
+        priority (Optional[str]): Priority class, None for the class of the current context.
+            Work outside any priority scope, e.g. CLI startup, ranks as interactive.
+
+    Returns:
+        int: Index of the class in PRIORITY_CLASSES.
+    """
+    priority = priority or _priority.get()
+    return PRIORITY_CLASSES.index(priority) if priority in PRIORITY_CLASSES else 0
+
+
+def session_weight(session_id: str, weight: Optional[float] = None) -> float:
+    """
+    Get the fair-queuing weight of a session.
+
+    Args:
+        session_id (str): Session the work belongs to.
+        weight (Optional[float]): Weight given by the caller, e.g. from the run config; wins over config.
+
+    Returns:
+        float: The weight, from the `scheduler.weights` config section or 1.0.
+    """
+    if weight is None:
+        weights = AppConfigLoader().get_config().get("scheduler", {}).get("weights", {}) or {}
+        weight = weights.get(session_id, 1.0)
+    return max(float(weight), 1e-6)
+
+
+def get_scheduler() -> Optional[PriorityScheduler]:
+    """
+    Retrieve the shared scheduler, creating it from the `scheduler` config section.
+
+    Returns:
+        Optional[PriorityScheduler]: The scheduler, or None when scheduling is disabled.
+    """
+    global _scheduler
+    settings = AppConfigLoader().get_config().get("scheduler", {}) or {}
+    if not settings.get("enabled", False):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            logger.info("Initializing shared priority scheduler.")
+            _scheduler = PriorityScheduler(
+                max_concurrency=settings.get("max_concurrency", 4),
+                wait_samples=settings.get("wait_samples", 1000),
+            )
+        return _scheduler
+
+
+def configure_scheduler(max_concurrency: int = 4, wait_samples: int = 1000) -> PriorityScheduler:
+    """
+    Replace the shared scheduler with a fresh one, e.g. to start a load test from empty queues.
+
+    get_scheduler returns it as long as `scheduler.enabled` is set.
+
+    Args:
+        max_concurrency (int): Number of slots.
+        wait_samples (int): Queue wait samples kept per class for the percentiles.
+
+    Returns:
+        PriorityScheduler: The new shared scheduler.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        logger.info(f"Configuring shared priority scheduler with {max_concurrency} slots.")
+        _scheduler = PriorityScheduler(max_concurrency=max_concurrency, wait_samples=wait_samples)
+        return _scheduler
@@ -0,0 +1,170 @@
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from src.services.big_query_runner import BigQueryRunner
+
+logger = logging.getLogger(__name__)
+
+_TYPE_ABBREVIATIONS = {
+    "STRING": "s",
+    "INTEGER": "i",
+    "INT64": "i",
+    "FLOAT": "f",
+    "FLOAT64": "f",
+    "NUMERIC": "n",
+    "BIGNUMERIC": "n",
+    "BOOLEAN": "b",
+    "BOOL": "b",
+    "TIMESTAMP": "ts",
+    "DATETIME": "dt",
+    "DATE": "d",
+    "GEOGRAPHY": "geo",
+    "RECORD": "rec",
+}
+
+_digests: Dict[str, Tuple[int, str]] = {}
+_digests_lock = threading.Lock()
+# (dataset, table) -> monotonic time of the last failed schema lookup.
+_failed_lookups: Dict[Tuple[str, str], float] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the token count of a text (4 characters per token).
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return (len(text) + 3) // 4
+
+
+def find_join_keys(schemas: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    """
+    Infer join keys from column naming: `<entity>_id` joins `<entity>s.id`,
+    or the same-named column of the `<entity>s` table.
+
+    Args:
+        schemas (Dict[str, List[Dict[str, Any]]]): Column definitions per table.
+
+    Returns:
+        List[str]: Join conditions such as "orders.user_id=users.id".
+    """
+    columns = {table: {col["name"] for col in schema} for table, schema in schemas.items()}
+    joins = []
+    for table, names in columns.items():
+        for name in sorted(names):
+            if not name.endswith("_id"):
+                continue
+            entity = name[: -len("_id")]
+            for target in (entity, f"{entity}s"):
+                if target == table or target not in columns:
+                    continue
+                if name in columns[target]:
+                    joins.append(f"{table}.{name}={target}.{name}")
+                elif "id" in columns[target]:
+                    joins.append(f"{table}.{name}={target}.id")
+                break
+    return joins
+
+
+def build_schema_digest(
+    dataset_id: str,
+    schemas: Dict[str, List[Dict[str, Any]]],
+    max_tokens: int = 600,
+) -> str:
+    """
+    Render table schemas as a compact digest that fits a token budget.
+
+    Compression steps, applied until the digest fits: abbreviated column types,
+    no types, then fewer columns per table.
+
+    Args:
+        dataset_id (str): Dataset the tables belong to.
+        schemas (Dict[str, List[Dict[str, Any]]]): Column definitions per table.
+        max_tokens (int): Token budget for the digest.
+
+    Returns:
+        str: The schema digest.
+    """
+    joins = find_join_keys(schemas)
+    legend = ", ".join(f"{abbr}={name}" for name, abbr in _TYPE_ABBREVIATIONS.items() if name in {
+        col["type"] for schema in schemas.values() for col in schema
+    })
+
+    def render(with_types: bool, max_columns: Optional[int]) -> str:
+        header = f"Tables in `{dataset_id}`" + (f" (types: {legend})" if with_types and legend else "") + ":"
+        lines = [header]
+        for table, schema in schemas.items():
+            shown = schema if max_columns is None else schema[:max_columns]
+            cols = [
+                f"{col['name']} {_TYPE_ABBREVIATIONS.get(col['type'], col['type'].lower())}" if with_types else col["name"]
+                for col in shown
+            ]
+            if len(schema) > len(shown):
+                cols.append(f"+{len(schema) - len(shown)} more")
+            lines.append(f"- {table}({', '.join(cols)})")
+        if joins:
+            lines.append("Joins: " + "; ".join(joins))
+        return "\n".join(lines)
+
+    digest = render(with_types=True, max_columns=None)
+    if estimate_tokens(digest) <= max_tokens:
+        return digest
+    digest = render(with_types=False, max_columns=None)
+    max_columns = max((len(schema) for schema in schemas.values()), default=0)
+    while estimate_tokens(digest) > max_tokens and max_columns > 1:
+        max_columns -= 1
+        digest = render(with_types=False, max_columns=max_columns)
+    return digest
+
+
+def get_schema_digest(runner: BigQueryRunner, tables: List[str], max_tokens: int = 600) -> str:
+    """
+    Get the schema digest for a runner's dataset, rebuilding it when the runner's schema cache changed.
+
+    Tables whose lookup failed are skipped for the runner's schema cache TTL, so a
+    dataset without them does not repeat the failing requests on every call.
+
+    Args:
+        runner (BigQueryRunner): Runner of the dataset.
+        tables (List[str]): Tables to include.
+        max_tokens (int): Token budget for the digest.
+
+    Returns:
+        str: The schema digest.
+
+    Raises:
+        ValueError: If none of the tables has a schema.
+    """
+    schemas = {}
+    for table in tables:
+        failure_key = (runner.dataset_id, table)
+        with _digests_lock:
+            failed_at = _failed_lookups.get(failure_key)
+        if failed_at is not None and time.monotonic() - failed_at < runner.schema_cache_ttl_seconds:
+            continue
+        try:
+            schemas[table] = runner.get_table_schema(table)
+        except Exception as e:
+            logger.warning(f"Skipping table {table} in schema digest: {e}")
+            with _digests_lock:
+                _failed_lookups[failure_key] = time.monotonic()
+    if not schemas:
+        raise ValueError(f"No table schemas available for the digest of {runner.dataset_id}.")
+
+    key = f"{runner.dataset_id}|{','.join(schemas)}|{max_tokens}"
+    with _digests_lock:
+        cached = _digests.get(key)
+        if cached is not None and cached[0] == runner.schema_version:
+            return cached[1]
+
+    digest = build_schema_digest(runner.dataset_id, schemas, max_tokens)
+    logger.info(f"Built schema digest for {runner.dataset_id}: {len(schemas)} tables, ~{estimate_tokens(digest)} tokens.")
+    with _digests_lock:
+        _digests[key] = (runner.schema_version, digest)
+    return digest
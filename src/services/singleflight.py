@@ -0,0 +1,110 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """
+    A single in-flight call shared by the leader and any waiting followers.
+
+    Attributes:
+        done (threading.Event): Set once the leader has finished.
+        result (Any): The leader's return value.
+        error (Optional[BaseException]): The leader's exception, if it failed.
+        followers (int): Number of callers that joined this call.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and receive the same result (or exception).
+
+    Attributes:
+        name (str): Name used in logs and stats.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Initialize the singleflight group.
+
+        Args:
+            name (str): Name used in logs and stats.
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._requests = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Run func for key, or wait for an identical in-flight call.
+
+        Args:
+            key (Hashable): Identity of the call.
+            func (Callable[[], Any]): The function to run if no call is in flight.
+
+        Returns:
+            Any: The result of the (possibly shared) call.
+
+        Raises:
+            Exception: Whatever the shared call raised.
+        """
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            logger.info(f"Singleflight '{self.name}': joining in-flight call.")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.followers:
+                logger.info(f"Singleflight '{self.name}': shared one call with {call.followers} waiting caller(s).")
+        return call.result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get request and coalescing counters.
+
+        Returns:
+            Dict[str, Any]: Total requests, coalesced requests and the coalescing ratio.
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests": self._requests,
+                "coalesced": self._coalesced,
+                "coalescing_ratio": self._coalesced / self._requests if self._requests else 0.0,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,90 @@
+import os
+import json
+import tempfile
+import unittest
+
+from src.services.blob_store import BlobStore, offload_text, expand_references, inline_length
+
+
+class BlobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parent = tempfile.TemporaryDirectory()
+        self.addCleanup(self.parent.cleanup)
+
+    def make_store(self, **kwargs) -> BlobStore:
+        return BlobStore(spill_dir=self.parent.name, **kwargs)
+
+    def test_malformed_and_traversal_keys_are_rejected(self):
+        store = self.make_store(memory_max_bytes=0)
+        store.put("spilled")
+        secret = os.path.join(self.parent.name, "secret.txt")
+        with open(secret, "w") as f:
+            f.write("do not read")
+        for key in ["../secret", "sha256:../../secret", "sha256:" + "0" * 63 + "/", "sha256:ABC", ""]:
+            self.assertIsNone(store.get(key), key)
+            with self.assertRaises(ValueError):
+                store._spill_path(key)
+
+    def test_unknown_well_formed_key_is_not_read_from_disk(self):
+        store = self.make_store(memory_max_bytes=0)
+        store.put("spilled")
+        planted = "sha256:" + "a" * 64
+        with open(store._spill_path(planted), "w") as f:
+            f.write("planted")
+        self.assertIsNone(store.get(planted))
+
+    def test_spilled_blob_is_reloaded(self):
+        store = self.make_store(memory_max_bytes=10)
+        first = store.put("first blob content")
+        second = store.put("second blob content")
+        stats = store.stats()
+        self.assertEqual(stats["memory_blobs"], 0)
+        self.assertEqual(stats["disk_blobs"], 2)
+        self.assertTrue(store.spill_dir.startswith(self.parent.name))
+        self.assertEqual(store.get(first), "first blob content")
+        self.assertEqual(store.get(second), "second blob content")
+
+    def test_oldest_spilled_blobs_are_deleted_over_disk_cap(self):
+        store = self.make_store(memory_max_bytes=0, disk_max_bytes=25)
+        first = store.put("a" * 10)
+        second = store.put("b" * 10)
+        third = store.put("c" * 10)
+        self.assertIsNone(store.get(first))
+        self.assertFalse(os.path.exists(store._spill_path(first)))
+        self.assertEqual(store.get(second), "b" * 10)
+        self.assertEqual(store.get(third), "c" * 10)
+        self.assertLessEqual(store.stats()["disk_bytes"], 25)
+
+    def test_same_content_gets_the_same_key(self):
+        store = self.make_store()
+        self.assertEqual(store.put("same"), store.put("same"))
+        self.assertEqual(store.stats()["memory_blobs"], 1)
+
+
+class OffloadTextTest(unittest.TestCase):
+
+    def test_short_text_stays_inline(self):
+        self.assertEqual(offload_text("short", inline_max_chars=100), "short")
+
+    def test_single_long_line_gets_a_short_preview(self):
+        schema = json.dumps([{"name": f"column_{i}", "type": "STRING", "mode": "NULLABLE"} for i in range(100)])
+        compact = offload_text(schema, inline_max_chars=2000, summary_lines=8)
+        self.assertLess(len(compact), 2000 // 4 + 200)
+        self.assertIn(f"| {len(schema)} chars]", compact)
+        self.assertEqual(expand_references(compact), schema)
+
+    def test_many_lines_are_cut_by_line_count(self):
+        text = "\n".join(f"row {i}" for i in range(100))
+        compact = offload_text(text, inline_max_chars=100, summary_lines=3)
+        self.assertIn("row 2\n... (97 more lines)", compact)
+
+    def test_inline_length_uses_the_recorded_size(self):
+        text = "x" * 5000
+        compact = offload_text(text, inline_max_chars=100)
+        self.assertEqual(inline_length(compact), 5000)
+        self.assertEqual(inline_length("plain"), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from src.graph.budget import new_budget, reserve_bytes
+
+
+class ReserveBytesTest(unittest.TestCase):
+    """Queries are rejected before they run once the bytes budget would be exceeded."""
+
+    def make_budget(self, max_bytes: int = 100, scanned: int = 0) -> dict:
+        budget = new_budget({"budget": {"max_bytes_scanned": max_bytes}})
+        budget["bytes_scanned"] = scanned
+        budget["iterations"] = 1
+        return budget
+
+    def test_query_over_remaining_bytes_is_rejected(self):
+        budget = self.make_budget(max_bytes=100, scanned=70)
+        self.assertFalse(reserve_bytes(budget, 40))
+        self.assertTrue(reserve_bytes(budget, 30))
+
+    def test_parallel_calls_of_a_step_share_the_remaining_bytes(self):
+        budget = self.make_budget(max_bytes=100)
+        self.assertTrue(reserve_bytes(budget, 60))
+        self.assertFalse(reserve_bytes(budget, 60))
+
+    def test_next_step_starts_from_the_charged_bytes(self):
+        budget = self.make_budget(max_bytes=100)
+        self.assertTrue(reserve_bytes(budget, 60))
+        budget["bytes_scanned"] += 60
+        budget["iterations"] += 1
+        self.assertTrue(reserve_bytes(budget, 40))
+        self.assertFalse(reserve_bytes(budget, 1))
+
+    def test_questions_do_not_share_reservations(self):
+        self.assertTrue(reserve_bytes(self.make_budget(max_bytes=100), 100))
+        self.assertTrue(reserve_bytes(self.make_budget(max_bytes=100), 100))
+
+    def test_no_budget_reserves_nothing(self):
+        self.assertTrue(reserve_bytes({}, 10 ** 12))
+
+
+if __name__ == "__main__":
+    unittest.main()
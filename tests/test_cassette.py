@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage
+
+from src.services.cassette import Cassette, CassetteMissError, MODE_RECORD, MODE_REPLAY
+
+
+class CassetteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def record(self, kind: str, interactions) -> None:
+        cassette = Cassette(self.directory.name, MODE_RECORD)
+        for request, result in interactions:
+            cassette.record(kind, request, lambda result=result: result)
+
+    def replayer(self) -> Cassette:
+        return Cassette(self.directory.name, MODE_REPLAY)
+
+    def test_same_request_is_replayed_in_recording_order(self):
+        self.record("bigquery_metadata", [({"table": "t"}, "first"), ({"table": "t"}, "second")])
+        cassette = self.replayer()
+        self.assertEqual(cassette.replay("bigquery_metadata", {"table": "t"}), "first")
+        self.assertEqual(cassette.replay("bigquery_metadata", {"table": "t"}), "second")
+        with self.assertRaises(CassetteMissError):
+            cassette.replay("bigquery_metadata", {"table": "t"})
+
+    def test_changed_request_without_fallback_misses(self):
+        self.record("bigquery_metadata", [({"table": "t"}, "schema")])
+        with self.assertRaises(CassetteMissError):
+            self.replayer().replay("bigquery_metadata", {"table": "other"})
+
+    def test_llm_fallback_does_not_serve_an_interaction_twice(self):
+        self.record("llm", [({"prompt": "a"}, AIMessage(content="A")), ({"prompt": "b"}, AIMessage(content="B"))])
+        cassette = self.replayer()
+        self.assertEqual(cassette.replay("llm", {"prompt": "changed"}).content, "A")
+        self.assertEqual(cassette.replay("llm", {"prompt": "b"}).content, "B")
+        with self.assertRaises(CassetteMissError):
+            cassette.replay("llm", {"prompt": "a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
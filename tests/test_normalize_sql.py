@@ -0,0 +1,48 @@
+import unittest
+
+from src.services.big_query_runner import normalize_sql
+
+
+class NormalizeSqlTest(unittest.TestCase):
+    """Coalescing keys must only merge queries that are the same query."""
+
+    def test_formatting_differences_share_a_key(self):
+        self.assertEqual(
+            normalize_sql("SELECT a,\n  b\nFROM t\tLIMIT 10;"),
+            normalize_sql("SELECT a, b FROM t LIMIT 10"),
+        )
+
+    def test_line_comment_keeps_its_terminating_newline(self):
+        with_newline = normalize_sql("SELECT a -- total\n, b FROM t LIMIT 10")
+        commented_out = normalize_sql("SELECT a -- total , b FROM t LIMIT 10")
+        self.assertNotEqual(with_newline, commented_out)
+        self.assertEqual(with_newline, "SELECT a -- total\n, b FROM t LIMIT 10")
+
+    def test_hash_comment_keeps_its_terminating_newline(self):
+        self.assertNotEqual(
+            normalize_sql("SELECT a # note\n, b FROM t LIMIT 10"),
+            normalize_sql("SELECT a # note , b FROM t LIMIT 10"),
+        )
+
+    def test_apostrophe_in_comment_does_not_break_literals(self):
+        sql = "SELECT x -- don't\nFROM t WHERE y = '  y' LIMIT 10"
+        self.assertIn("'  y'", normalize_sql(sql))
+        self.assertNotEqual(
+            normalize_sql(sql),
+            normalize_sql("SELECT x -- don't\nFROM t WHERE y = ' y' LIMIT 10"),
+        )
+
+    def test_whitespace_inside_literals_and_block_comments_is_kept(self):
+        self.assertNotEqual(
+            normalize_sql("SELECT 'a  b' FROM t LIMIT 1"),
+            normalize_sql("SELECT 'a b' FROM t LIMIT 1"),
+        )
+        self.assertNotEqual(
+            normalize_sql("SELECT \"\"\"x\n  y\"\"\" FROM t LIMIT 1"),
+            normalize_sql("SELECT \"\"\"x y\"\"\" FROM t LIMIT 1"),
+        )
+        self.assertIn("/* keep  this */", normalize_sql("SELECT 1 /* keep  this */ LIMIT 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import threading
+import unittest
+from unittest import mock
+
+from src.graph.prefetch import SpeculativePrefetcher
+
+
+def fake_runner() -> mock.Mock:
+    runner = mock.Mock()
+    runner.cached_schemas.return_value = {}
+    return runner
+
+
+class SpeculativePrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = fake_runner()
+        patches = [
+            mock.patch("src.graph.prefetch.get_cassette", return_value=None),
+            mock.patch("src.graph.prefetch.get_scheduler", return_value=None),
+            mock.patch("src.graph.prefetch.get_runner", return_value=self.runner),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_steps_stop_once_the_turn_is_done(self):
+        prefetcher = SpeculativePrefetcher(tables=["orders", "users"], workers=1)
+        turn_done = threading.Event()
+
+        def refresh(table, refresh=False):
+            turn_done.set()
+
+        self.runner.get_table_schema.side_effect = refresh
+        future = prefetcher.start("orders per user", turn_done=turn_done)
+        self.assertEqual(future.result(timeout=5), 0)
+        self.assertEqual(self.runner.get_table_schema.call_count, 1)
+
+    def test_cancelled_prefetch_never_runs(self):
+        prefetcher = SpeculativePrefetcher(tables=["orders"], workers=1)
+        release = threading.Event()
+        self.runner.get_table_schema.side_effect = lambda table, refresh=False: release.wait(5)
+        running = prefetcher.start("orders")
+        queued = prefetcher.start("orders")
+        self.assertTrue(queued.cancel())
+        release.set()
+        running.result(timeout=5)
+        self.assertEqual(self.runner.get_table_schema.call_count, 1)
+
+    def test_pending_prefetches_are_bounded(self):
+        prefetcher = SpeculativePrefetcher(tables=["orders"], workers=1, max_pending=2)
+        release = threading.Event()
+        self.runner.get_table_schema.side_effect = lambda table, refresh=False: release.wait(5)
+        first = prefetcher.start("orders")
+        second = prefetcher.start("orders")
+        self.assertIsNone(prefetcher.start("orders"))
+        second.cancel()
+        self.assertIsNotNone(prefetcher.start("orders"))
+        release.set()
+        first.result(timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
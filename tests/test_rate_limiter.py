@@ -0,0 +1,160 @@
+import time
+import threading
+import unittest
+
+from google.api_core import exceptions as api_exceptions
+
+from src.services.deadline import DeadlineExceeded, deadline_scope
+from src.services.rate_limiter import RateLimiter, is_quota_error
+from src.services.scheduler import priority_scope, PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_PREFETCH
+
+
+def rate_limit_error() -> Exception:
+    return api_exceptions.TooManyRequests("slow down", errors=[{"reason": "rateLimitExceeded"}])
+
+
+def throttled_call():
+    raise rate_limit_error()
+
+
+class IsQuotaErrorTest(unittest.TestCase):
+    """Only transient rate limits are backed off; hard quotas fail fast."""
+
+    def test_status_429_is_transient(self):
+        self.assertTrue(is_quota_error(api_exceptions.TooManyRequests("busy")))
+
+    def test_rate_limit_reason_is_transient(self):
+        error = api_exceptions.Forbidden("too many jobs", errors=[{"reason": "rateLimitExceeded"}])
+        self.assertTrue(is_quota_error(error))
+
+    def test_hard_quota_is_not_transient(self):
+        error = api_exceptions.Forbidden("daily quota", errors=[{"reason": "quotaExceeded"}])
+        self.assertFalse(is_quota_error(error))
+
+    def test_hard_quota_wins_over_429(self):
+        error = api_exceptions.TooManyRequests("daily quota", errors=[{"reason": "quotaExceeded"}])
+        self.assertFalse(is_quota_error(error))
+
+    def test_wrapped_cause_is_followed(self):
+        try:
+            try:
+                raise rate_limit_error()
+            except Exception as e:
+                raise RuntimeError("call failed") from e
+        except RuntimeError as wrapped:
+            self.assertTrue(is_quota_error(wrapped))
+
+    def test_message_mentioning_quota_is_not_classified(self):
+        self.assertFalse(is_quota_error(ValueError("column quota_exceeded not found")))
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def make_limiter(self, **kwargs) -> RateLimiter:
+        settings = {
+            "requests_per_second": 100.0,
+            "burst": 1,
+            "max_concurrency": 4,
+            "max_retries": 2,
+            "initial_backoff_seconds": 0.02,
+            "max_backoff_seconds": 0.1,
+        }
+        settings.update(kwargs)
+        return RateLimiter(name="test", **settings)
+
+    def test_burst_is_served_without_waiting_then_paced(self):
+        limiter = self.make_limiter(requests_per_second=20.0, burst=2)
+        waits = []
+        for _ in range(3):
+            waits.append(limiter.acquire())
+            limiter.release()
+        self.assertLess(max(waits[:2]), 0.01)
+        self.assertGreater(waits[2], 0.02)
+
+    def test_zero_rate_limits_concurrency_only(self):
+        limiter = self.make_limiter(requests_per_second=0, burst=1)
+        for _ in range(50):
+            limiter.call(lambda: None)
+        self.assertLess(limiter.metrics()["max_wait_seconds"], 0.01)
+
+    def test_quota_error_is_retried_after_backoff(self):
+        limiter = self.make_limiter()
+        attempts = []
+
+        def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise rate_limit_error()
+            return "ok"
+
+        self.assertEqual(limiter.call(flaky), "ok")
+        self.assertEqual(len(attempts), 2)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.015)
+        metrics = limiter.metrics()
+        self.assertEqual(metrics["throttled"], 1)
+        self.assertLess(metrics["current_rate"], 100.0)
+
+    def test_rate_recovers_after_successful_calls(self):
+        limiter = self.make_limiter(recovery_factor=2.0)
+        with self.assertRaises(api_exceptions.TooManyRequests):
+            limiter.call(throttled_call)
+        lowered = limiter.metrics()["current_rate"]
+        for _ in range(5):
+            limiter.call(lambda: None)
+        self.assertLess(lowered, 100.0)
+        self.assertEqual(limiter.metrics()["current_rate"], 100.0)
+
+    def test_retries_are_bounded(self):
+        limiter = self.make_limiter(max_retries=2)
+        calls = []
+        with self.assertRaises(api_exceptions.TooManyRequests):
+            limiter.call(lambda: calls.append(1) or throttled_call())
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        limiter = self.make_limiter()
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise api_exceptions.Forbidden("daily quota", errors=[{"reason": "quotaExceeded"}])
+
+        with self.assertRaises(api_exceptions.Forbidden):
+            limiter.call(broken)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(limiter.metrics()["throttled"], 0)
+
+    def test_wait_ends_at_the_deadline(self):
+        limiter = self.make_limiter(requests_per_second=1.0, burst=1)
+        limiter.call(lambda: None)
+        start = time.monotonic()
+        with deadline_scope(time.time() + 0.05):
+            with self.assertRaises(DeadlineExceeded):
+                limiter.call(lambda: None)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(limiter.metrics()["queue_depth"], 0)
+
+    def test_queued_calls_are_served_in_priority_order(self):
+        limiter = self.make_limiter(requests_per_second=0, max_concurrency=1)
+        limiter.acquire()
+        order = []
+
+        def work(priority: str) -> None:
+            with priority_scope(priority):
+                limiter.call(lambda: order.append(priority))
+
+        threads = []
+        for i, priority in enumerate([PRIORITY_PREFETCH, PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_BATCH]):
+            thread = threading.Thread(target=work, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            while limiter.metrics()["queue_depth"] < i + 1:
+                time.sleep(0.001)
+        limiter.release()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(order, [PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BATCH, PRIORITY_PREFETCH])
+
+
+if __name__ == "__main__":
+    unittest.main()
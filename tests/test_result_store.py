@@ -0,0 +1,97 @@
+import time
+import unittest
+
+import pandas as pd
+
+from src.graph.tools.bigquery import fetch_query_result_page_tool, resolve_dataset
+from src.services.result_store import ResultStore, get_result_store
+
+SCOPE = ("project-a", "project-a.shop")
+OTHER_SCOPE = ("project-b", "project-b.shop")
+
+
+def frame(rows: int = 3) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(rows), "name": [f"n{i}" for i in range(rows)]})
+
+
+class ResultStoreTest(unittest.TestCase):
+
+    def test_handle_is_stable_per_query_and_scope(self):
+        store = ResultStore()
+        self.assertEqual(store.put("SELECT 1", frame(), SCOPE), store.put("SELECT 1", frame(), SCOPE))
+        self.assertNotEqual(store.put("SELECT 1", frame(), SCOPE), store.put("SELECT 1", frame(), OTHER_SCOPE))
+
+    def test_other_scope_cannot_read_a_result(self):
+        store = ResultStore()
+        handle = store.put("SELECT 1", frame(), SCOPE)
+        with self.assertRaises(KeyError):
+            store.get(handle, OTHER_SCOPE)
+        self.assertEqual(len(store.get(handle, SCOPE)), 3)
+
+    def test_handles_expire_after_ttl(self):
+        store = ResultStore(ttl_seconds=0.05)
+        handle = store.put("SELECT 1", frame(), SCOPE)
+        time.sleep(0.1)
+        with self.assertRaises(KeyError):
+            store.get(handle, SCOPE)
+        self.assertEqual(store.stats()["handles"], 0)
+
+    def test_least_recently_used_is_evicted_over_handle_cap(self):
+        store = ResultStore(max_handles=2)
+        first = store.put("SELECT 1", frame(), SCOPE)
+        second = store.put("SELECT 2", frame(), SCOPE)
+        store.get(first, SCOPE)
+        store.put("SELECT 3", frame(), SCOPE)
+        self.assertEqual(len(store.get(first, SCOPE)), 3)
+        with self.assertRaises(KeyError):
+            store.get(second, SCOPE)
+
+    def test_least_recently_used_is_evicted_over_byte_cap(self):
+        size = int(frame(100).memory_usage(deep=True).sum())
+        store = ResultStore(max_bytes=2 * size + size // 2)
+        first = store.put("SELECT 1", frame(100), SCOPE)
+        store.put("SELECT 2", frame(100), SCOPE)
+        store.put("SELECT 3", frame(100), SCOPE)
+        with self.assertRaises(KeyError):
+            store.get(first, SCOPE)
+        self.assertLessEqual(store.stats()["bytes"], store.max_bytes)
+
+    def test_result_larger_than_cap_gets_no_handle(self):
+        store = ResultStore(max_bytes=10)
+        self.assertIsNone(store.put("SELECT 1", frame(100), SCOPE))
+
+
+class FetchQueryResultPageToolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = resolve_dataset()
+        df = pd.DataFrame({"id": [3, 1, 2, 5, 4], "city": ["c", "a", "b", "e", "d"], "n": [30, 10, 20, 50, 40]})
+        self.handle = get_result_store().put("SELECT id, city, n FROM t LIMIT 5", df, self.scope)
+
+    def fetch(self, **kwargs) -> str:
+        return fetch_query_result_page_tool.invoke({"handle": self.handle, "state": {}, **kwargs})
+
+    def test_page_with_offset_and_limit(self):
+        page = self.fetch(offset=1, limit=2)
+        self.assertIn("Rows 1-3 of 5", page)
+        self.assertNotIn(" 30", page)
+        self.assertIn(" 10", page)
+        self.assertIn(" 20", page)
+
+    def test_projection_and_sort(self):
+        page = self.fetch(columns=["city"], sort_by="city", ascending=False, limit=2)
+        self.assertNotIn("n", page.splitlines()[1])
+        lines = page.splitlines()[2:]
+        self.assertTrue(lines[0].endswith("e"))
+        self.assertTrue(lines[1].endswith("d"))
+
+    def test_unknown_column_is_reported(self):
+        self.assertIn("ERROR: Unknown columns ['x']", self.fetch(columns=["x"]))
+
+    def test_other_dataset_cannot_fetch(self):
+        result = self.fetch(state={"project_id": "other-project", "dataset_id": "other-project.shop"})
+        self.assertTrue(result.startswith("ERROR:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import time
+import threading
+import unittest
+from typing import List, Tuple
+
+from src.services.scheduler import (
+    PriorityScheduler,
+    PRIORITY_CLASSES,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BATCH,
+    PRIORITY_PREFETCH,
+)
+
+
+def queued(scheduler: PriorityScheduler) -> int:
+    metrics = scheduler.metrics()
+    return sum(metrics[cls]["queued"] for cls in PRIORITY_CLASSES)
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not reached in time.")
+        time.sleep(0.001)
+
+
+def grant_order(requests: List[Tuple[str, str, float]]) -> List[str]:
+    """
+    Queue requests one by one behind a held slot, then release it and record
+    the order in which the requests get the single slot.
+    """
+    scheduler = PriorityScheduler(max_concurrency=1)
+    scheduler.acquire(PRIORITY_INTERACTIVE, "holder")
+    order: List[str] = []
+    threads = []
+
+    def work(label: str, priority: str, session_id: str, weight: float) -> None:
+        with scheduler.slot(priority, session_id, weight):
+            order.append(label)
+
+    for i, (priority, session_id, weight) in enumerate(requests):
+        label = f"{session_id}:{i}"
+        thread = threading.Thread(target=work, args=(label, priority, session_id, weight))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: queued(scheduler) == i + 1)
+    scheduler.release()
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+class PrioritySchedulerTest(unittest.TestCase):
+
+    def test_classes_are_served_in_strict_order(self):
+        order = grant_order([
+            (PRIORITY_PREFETCH, "p", 1.0),
+            (PRIORITY_BATCH, "b", 1.0),
+            (PRIORITY_INTERACTIVE, "i", 1.0),
+            (PRIORITY_BATCH, "b", 1.0),
+        ])
+        self.assertEqual(order, ["i:2", "b:1", "b:3", "p:0"])
+
+    def test_sessions_of_a_class_take_turns(self):
+        order = grant_order([
+            (PRIORITY_BATCH, "a", 1.0),
+            (PRIORITY_BATCH, "a", 1.0),
+            (PRIORITY_BATCH, "a", 1.0),
+            (PRIORITY_BATCH, "b", 1.0),
+            (PRIORITY_BATCH, "b", 1.0),
+        ])
+        self.assertEqual(order, ["a:0", "b:3", "a:1", "b:4", "a:2"])
+
+    def test_heavier_session_gets_a_larger_share(self):
+        order = grant_order([(PRIORITY_BATCH, "a", 2.0)] * 4 + [(PRIORITY_BATCH, "b", 1.0)] * 2)
+        self.assertEqual(order, ["a:0", "b:4", "a:1", "a:2", "b:5", "a:3"])
+
+    def test_timed_out_request_leaves_the_queue(self):
+        scheduler = PriorityScheduler(max_concurrency=1)
+        scheduler.acquire(PRIORITY_BATCH, "holder")
+        self.assertFalse(scheduler.acquire(PRIORITY_INTERACTIVE, "late", timeout=0.05))
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics[PRIORITY_INTERACTIVE]["queued"], 0)
+        self.assertEqual(metrics[PRIORITY_INTERACTIVE]["timeouts"], 1)
+        scheduler.release()
+        self.assertTrue(scheduler.acquire(PRIORITY_PREFETCH, "next", timeout=0.05))
+
+    def test_unknown_class_is_rejected(self):
+        with self.assertRaises(ValueError):
+            PriorityScheduler().acquire("urgent", "s")
+
+
+if __name__ == "__main__":
+    unittest.main()